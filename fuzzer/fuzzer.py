@@ -1,10 +1,17 @@
 import json
-import copy
-import requests
-from typing import Dict, List, Optional
+import random
+import asyncio
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 from oracle.oracle import Oracle
+from oracle.network_log import iter_log_entries
 from urllib.parse import urlparse
+from .journal import JournalResults, ResultsJournal
+from .plan import iter_planned_requests, plan_requests
+from .transport import HTTPTransport, RateLimitedTransport, ThrottledError, Transport
 
 @dataclass
 class User:
@@ -12,18 +19,89 @@ class User:
     role: str
     auth_token: str
 
+class RequestVariant(Mapping):
+    """
+    Read-only view of a request with its own headers and path.
+    
+    Every other field, the body included, is shared with the original request
+    rather than copied, so variants must not be modified.
+    """
+    __slots__ = ("_request", "_headers", "_path")
+    
+    def __init__(self, request: Dict, headers: Dict[str, str], path: str):
+        self._request = request
+        self._headers = headers
+        self._path = path
+    
+    def __getitem__(self, key: str) -> Any:
+        if key == "headers":
+            return self._headers
+        if key == "path":
+            return self._path
+        return self._request[key]
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from self._request
+        if "headers" not in self._request:
+            yield "headers"
+        if "path" not in self._request:
+            yield "path"
+    
+    def __len__(self) -> int:
+        return len(self._request) + ("headers" not in self._request) + ("path" not in self._request)
+    
+    def to_dict(self) -> Dict:
+        """A plain dict of the variant, still sharing the original's field values."""
+        return dict(self)
+
 class AuthFuzzer:
-    def __init__(self, oracle: Oracle, users: List[User]):
+    def __init__(
+        self,
+        oracle: Oracle,
+        users: List[User],
+        transport: Optional[Transport] = None,
+        exhaustive: bool = False,
+        users_per_role: Optional[int] = None,
+        seed: int = 0,
+        rate_limit: Optional[float] = None
+    ):
         """
         Initialize the authentication fuzzer.
         
         Args:
             oracle: Oracle instance for checking vulnerabilities
             users: List of User objects with their auth tokens
+            transport: Transport used to send requests, defaults to a pooled HTTPTransport
+            exhaustive: Replay every request as every other known user instead of one user
+                of the same role and one of a different role
+            users_per_role: In exhaustive mode, only replay as this many users of each role,
+                sampled once per fuzzer, or None to use all of them
+            seed: Seed of the users_per_role sample
+            rate_limit: Starting requests per second per host of an adaptive rate limiter
+                (see transport.RateLimitedTransport), or None to send without pacing
         """
         self.oracle = oracle
         self.users = users
         self.users_by_role = self._group_users_by_role()
+        # The first user with a token owns it, as when users were scanned in order
+        self._users_by_token: Dict[str, User] = {}
+        for user in users:
+            self._users_by_token.setdefault(user.auth_token, user)
+        self.exhaustive = exhaustive
+        
+        # Precompute the variant users so fuzzing a request is a lookup
+        self._same_role_users = {user.id: self._get_same_role_user(user) for user in users}
+        self._different_role_users = {role: self._get_different_role_user(role) for role in self.users_by_role}
+        self.matrix_users = self._sample_users(users_per_role, seed)
+        
+        self._owns_transport = transport is None
+        self.transport = transport if transport is not None else self._create_transport()
+        if rate_limit is not None:
+            self.transport = RateLimitedTransport(self.transport, rate=rate_limit)
+    
+    def _create_transport(self) -> Transport:
+        """Create the default transport used when none is injected."""
+        return HTTPTransport()
         
     def _group_users_by_role(self) -> Dict[str, List[User]]:
         """Group users by their roles for easier access."""
@@ -41,6 +119,18 @@ class AuthFuzzer:
                 return users[0]
         return None
     
+    def _sample_users(self, users_per_role: Optional[int], seed: int) -> List[User]:
+        """Users to replay requests as in exhaustive mode, at most users_per_role of each role."""
+        if users_per_role is None:
+            return list(self.users)
+        rng = random.Random(seed)
+        sampled = set()
+        for users in self.users_by_role.values():
+            chosen = users if len(users) <= users_per_role else rng.sample(users, users_per_role)
+            sampled.update(id(user) for user in chosen)
+        # Keep the order users were given in
+        return [user for user in self.users if id(user) in sampled]
+    
     def _get_same_role_user(self, current_user: User) -> Optional[User]:
         """Get a different user with the same role."""
         same_role_users = self.users_by_role[current_user.role]
@@ -60,49 +150,53 @@ class AuthFuzzer:
             auth_token = auth_token[7:]
             
         # Find user with this auth token
-        for user in self.users:
-            # Compare without 'Bearer ' prefix
-            if user.auth_token == auth_token:
-                return user
-        return None
+        return self._users_by_token.get(auth_token)
     
-    def _create_request_variant(self, original_request: Dict, auth_token: Optional[str] = None) -> Dict:
-        """Create a variant of the request with modified authentication."""
-        request = copy.deepcopy(original_request)
+    def _create_request_variant(
+        self,
+        original_request: Dict,
+        auth_token: Optional[str] = None,
+        path: Optional[str] = None
+    ) -> RequestVariant:
+        """
+        Create a variant of the request with modified authentication.
+        
+        Only the headers are copied. path is the request's URL path, which is parsed
+        from the URL when not given.
+        """
+        headers = dict(original_request.get("headers", {}))
         if auth_token:
             # Add Bearer prefix if not present
             if not auth_token.startswith('Bearer '):
                 auth_token = f'Bearer {auth_token}'
-            request["headers"]["authorization"] = auth_token
+            headers["authorization"] = auth_token
         else:
-            request["headers"].pop("authorization", None)
-            
-        # Extract path from URL and add it to request
-        parsed_url = urlparse(request["url"])
-        request["path"] = parsed_url.path
-            
-        return request
+            headers.pop("authorization", None)
+        
+        if path is None:
+            path = urlparse(original_request["url"]).path
+        
+        return RequestVariant(original_request, headers, path)
     
-    def _send_request(self, request: Dict) -> Dict:
-        """Send HTTP request and return response."""
+    def _send_request(self, request: Mapping, once: bool = False) -> Dict:
+        """
+        Send HTTP request and return response.
+        
+        With once set, the transport is a RateLimitedTransport whose host token the caller
+        already took, and a throttled request raises ThrottledError instead of being resent.
+        """
         method = request["method"].lower()
         url = request["url"]
         headers = request["headers"]
         data = request.get("body")
         
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=data if data else None
-            )
-            
-            return {
-                "status": response.status_code,
-                "body": response.json() if response.text else None,
-                "headers": dict(response.headers)
-            }
+            if once:
+                return self.transport.send_once(method, url, headers, data)
+            return self.transport.send(method, url, headers, data)
+        except ThrottledError:
+            # A throttled request says nothing about authorization, so it is not judged
+            raise
         except Exception as e:
             print(f"Error sending request: {e}")
             return {
@@ -111,6 +205,68 @@ class AuthFuzzer:
                 "headers": {}
             }
     
+    def _get_test_cases(self, current_user: User) -> List[Dict]:
+        """Build the authentication variants to try for a request made by current_user."""
+        no_auth = {
+            "name": "no_auth",
+            "auth_token": None,
+            "user_id": None,
+            "description": "Request with no authentication"
+        }
+        
+        if self.exhaustive:
+            # One variant per other user, in the order users were given
+            return [no_auth] + [
+                {
+                    "name": "same_role" if user.role == current_user.role else "different_role",
+                    "auth_token": user.auth_token,
+                    "user_id": user.id,
+                    "description": f"Request as user {user.id} with role {user.role}"
+                }
+                for user in self.matrix_users if user.id != current_user.id
+            ]
+        
+        same_role_user = self._same_role_users.get(current_user.id)
+        different_role_user = self._different_role_users.get(current_user.role)
+        test_cases = [no_auth]
+        
+        # Same role, different user
+        if same_role_user:
+            test_cases.append({
+                "name": "same_role",
+                "auth_token": same_role_user.auth_token,
+                "user_id": same_role_user.id,
+                "description": "Request with different user, same role"
+            })
+        
+        # Different role
+        if different_role_user:
+            test_cases.append({
+                "name": "different_role",
+                "auth_token": different_role_user.auth_token,
+                "user_id": different_role_user.id,
+                "description": "Request with user of different role"
+            })
+        
+        return test_cases
+    
+    def _build_result(self, test: Dict, variant_request: RequestVariant, response: Dict) -> Dict:
+        """Check a variant's response against the oracle and build its result entry."""
+        timing = response.pop("timing", None)
+        is_vulnerable = self.oracle.check_violation(variant_request, response)
+        explanation = self.oracle.explain_violation(variant_request, response) if is_vulnerable else None
+        
+        return {
+            "test_case": test["name"],
+            "description": test["description"],
+            "as_user": test["user_id"],
+            "original_request": variant_request.to_dict(),
+            "response": response,
+            "is_vulnerable": is_vulnerable,
+            "vulnerability_explanation": explanation,
+            "timing": timing
+        }
+    
     def fuzz_request(self, request: Dict) -> List[Dict]:
         """
         Generate and test authentication variants for a request.
@@ -122,59 +278,230 @@ class AuthFuzzer:
             - is_vulnerable: Whether the oracle found a vulnerability
             - description: Description of the vulnerability if found
         """
+        return self._fuzz_request(request)[0]
+    
+    def _fuzz_request(self, request: Dict) -> Tuple[List[Dict], bool]:
+        """Fuzz a request, returning its results and whether no variant was skipped for being throttled."""
         results = []
+        complete = True
         current_user = self._extract_auth_info(request)
         
         if not current_user:
             print("Skipping request - no authentication token found")
-            return results
-            
-        # Test cases to try
-        test_cases = [
-            # No authentication
-            {
-                "name": "no_auth",
-                "auth_token": None,
-                "description": "Request with no authentication"
-            },
-            
-            # Same role, different user
-            {
-                "name": "same_role",
-                "auth_token": self._get_same_role_user(current_user).auth_token if self._get_same_role_user(current_user) else None,
-                "description": "Request with different user, same role"
-            },
+            return results, complete
             
-            # Different role
-            {
-                "name": "different_role",
-                "auth_token": self._get_different_role_user(current_user.role).auth_token if self._get_different_role_user(current_user.role) else None,
-                "description": "Request with user of different role"
-            }
-        ]
-        
         # Run each test case
-        for test in test_cases:
-            if test["auth_token"] is not None or test["name"] == "no_auth":
-                variant_request = self._create_request_variant(request, test["auth_token"])
+        path = urlparse(request["url"]).path
+        for test in self._get_test_cases(current_user):
+            variant_request = self._create_request_variant(request, test["auth_token"], path)
+            try:
                 response = self._send_request(variant_request)
-                
-                # Check for vulnerability
-                is_vulnerable = self.oracle.check_violation(variant_request, response)
-                explanation = self.oracle.explain_violation(variant_request, response) if is_vulnerable else None
-                
-                results.append({
-                    "test_case": test["name"],
-                    "description": test["description"],
-                    "original_request": variant_request,
-                    "response": response,
-                    "is_vulnerable": is_vulnerable,
-                    "vulnerability_explanation": explanation
-                })
-        
-        return results
+            except ThrottledError as e:
+                print(f"Skipping {test['name']} variant - {e}")
+                complete = False
+                continue
+            results.append(self._build_result(test, variant_request, response))
+        
+        return results, complete
+    
+    def close(self) -> None:
+        """Close the transport if this fuzzer created it."""
+        if self._owns_transport:
+            self.transport.close()
+
+class AsyncAuthFuzzer(AuthFuzzer):
+    def __init__(
+        self,
+        oracle: Oracle,
+        users: List[User],
+        max_concurrency: int = 32,
+        max_per_host: int = 8,
+        transport: Optional[Transport] = None,
+        exhaustive: bool = False,
+        users_per_role: Optional[int] = None,
+        seed: int = 0,
+        rate_limit: Optional[float] = None
+    ):
+        """
+        Initialize a fuzzer that sends request variants concurrently.
+        
+        Args:
+            oracle: Oracle instance for checking vulnerabilities
+            users: List of User objects with their auth tokens
+            max_concurrency: Maximum number of requests in flight overall
+            max_per_host: Maximum number of requests in flight to a single host
+            transport: Transport used to send requests, defaults to a pooled HTTPTransport
+            exhaustive: Replay every request as every other known user, as in AuthFuzzer
+            users_per_role: In exhaustive mode, only replay as this many users of each role
+            seed: Seed of the users_per_role sample
+            rate_limit: Starting requests per second per host of an adaptive rate limiter
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        super().__init__(oracle, users, transport, exhaustive, users_per_role, seed, rate_limit)
+        self._requests_started = 0
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+    
+    def _create_transport(self) -> Transport:
+        # Size the shared connection pool so every in-flight request can reuse a connection
+        return HTTPTransport(pool_size=self.max_concurrency)
+    
+    def _get_host_limit(self, url: str) -> asyncio.Semaphore:
+        """Get the concurrency limit shared by all requests to the URL's host."""
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+    
+    async def _run_test_case(self, request: Dict, test: Dict, path: Optional[str] = None) -> Optional[Dict]:
+        """Send a single variant within the concurrency limits and judge the response, or None if it was throttled."""
+        variant_request = self._create_request_variant(request, test["auth_token"], path)
+        try:
+            response = await self._send_variant(variant_request)
+        except ThrottledError as e:
+            print(f"Skipping {test['name']} variant - {e}")
+            return None
+        
+        return self._build_result(test, variant_request, response)
+    
+    async def _send_in_slots(self, request: Mapping, once: bool = False) -> Dict:
+        """Send a request on a worker thread while holding its host's and a global slot."""
+        # Wait for the host before taking a global slot, so a busy host cannot starve the others
+        async with self._get_host_limit(request["url"]), self._global_limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._send_request, request, once)
+    
+    async def _send_variant(self, request: Mapping) -> Dict:
+        """
+        Send a variant within the concurrency limits.
+        
+        With a rate limiter, pacing and throttle backoff are waited out without holding a
+        slot, so a throttling host does not keep requests to other hosts waiting.
+        """
+        if not isinstance(self.transport, RateLimitedTransport):
+            return await self._send_in_slots(request)
+        
+        limiter = self.transport.limiter_for(request["url"])
+        retries = self.transport.max_throttle_retries
+        for _ in range(retries + 1):
+            wait = limiter.try_acquire()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = limiter.try_acquire()
+            try:
+                return await self._send_in_slots(request, once=True)
+            except ThrottledError:
+                pass
+        raise ThrottledError(
+            f"{request['method'].upper()} {request['url']} was still throttled after {retries} retries"
+        )
+    
+    async def fuzz_request_async(self, request: Dict) -> List[Dict]:
+        """
+        Concurrently test authentication variants for a request.
+        
+        Returns the same results, in the same order, as fuzz_request.
+        """
+        return (await self._fuzz_request_async(request))[0]
+    
+    async def _fuzz_request_async(self, request: Dict) -> Tuple[List[Dict], bool]:
+        """Fuzz a request concurrently, returning its results and whether no variant was throttled."""
+        current_user = self._extract_auth_info(request)
+        
+        if not current_user:
+            print("Skipping request - no authentication token found")
+            return [], True
+        
+        test_cases = self._get_test_cases(current_user)
+        if not test_cases:
+            return [], True
+        
+        # Start each request's variants at a different user, so the requests in flight
+        # at once are spread over users' sessions rather than all replaying as the same one
+        offset = self._requests_started % len(test_cases)
+        self._requests_started += 1
+        path = urlparse(request["url"]).path
+        tasks = {}
+        for index in list(range(offset, len(test_cases))) + list(range(offset)):
+            tasks[index] = asyncio.ensure_future(self._run_test_case(request, test_cases[index], path))
+        
+        results = await asyncio.gather(*(tasks[index] for index in range(len(test_cases))))
+        return [result for result in results if result is not None], None not in results
+    
+    def close(self) -> None:
+        """Release the worker threads and pooled connections."""
+        self._executor.shutdown(wait=True)
+        super().close()
+
+def _iter_log_requests(entries: Iterable[Dict]):
+    """Yield (probe key, original requests, request) for every log entry that carries a request."""
+    for entry in entries:
+        if "request" in entry:
+            # Add request ID and timestamp to the request object
+            request = entry["request"]
+            request["id"] = entry["id"]
+            request["timestamp"] = entry["timestamp"]
+            yield json.dumps(["entry", entry["id"]]), [{"id": entry["id"], "timestamp": entry["timestamp"]}], request
+
+def _iter_requests_to_fuzz(network_log_file: str, oracle: Oracle, users: List[User], dedupe: bool):
+    """
+    Yield (probe key, original requests, request), one per distinct probe when dedupe is set.
+    
+    The probe key identifies the request across runs over the same log, for the results journal.
+    Deduplication reads the log twice: once to plan the probes from their signatures and entry
+    ids, and once to stream each probe's request, body included, as it is about to be fuzzed.
+    """
+    if not dedupe:
+        yield from _iter_log_requests(iter_log_entries(network_log_file))
+        return
+    plan = plan_requests(iter_log_entries(network_log_file), oracle, users)
+    for probe, request in iter_planned_requests(plan, iter_log_entries(network_log_file)):
+        yield json.dumps(probe.signature), probe.original_requests, request
+
+def _tag_results(results: List[Dict], originals: List[Dict]) -> List[Dict]:
+    """Add metadata of the original requests a fuzzed request stands for to its results."""
+    for result in results:
+        result["original_request_id"] = originals[0]["id"]
+        result["original_timestamp"] = originals[0]["timestamp"]
+        result["original_request_ids"] = [original["id"] for original in originals]
+    return results
 
-def fuzz_requests(network_log_file: str, oracle: Oracle, users: List[User]) -> List[Dict]:
+def _open_journal(
+    path: Optional[str], users: List[User], dedupe: bool, exhaustive: bool, users_per_role: Optional[int]
+) -> Optional[ResultsJournal]:
+    """Open a results journal for a run, which refuses to resume a run with other settings."""
+    if not path:
+        return None
+    return ResultsJournal(path, settings={
+        "dedupe": dedupe,
+        "exhaustive": exhaustive,
+        "users_per_role": users_per_role,
+        "users": sorted(user.id for user in users)
+    })
+
+def _collect_results(
+    journal: Optional[ResultsJournal], all_results: List[Dict], key: str, results: List[Dict], complete: bool
+) -> None:
+    """Record a probe's results in the journal if there is one, or keep them in memory."""
+    if journal is not None:
+        journal.record(key, results, complete)
+    else:
+        all_results.extend(results)
+
+def fuzz_requests(
+    network_log_file: str,
+    oracle: Oracle,
+    users: List[User],
+    transport: Optional[Transport] = None,
+    dedupe: bool = True,
+    exhaustive: bool = False,
+    users_per_role: Optional[int] = None,
+    rate_limit: Optional[float] = None,
+    journal: Optional[str] = None
+) -> Iterable[Dict]:
     """
     Fuzz a corpus of requests for authentication vulnerabilities.
     
@@ -182,33 +509,134 @@ def fuzz_requests(network_log_file: str, oracle: Oracle, users: List[User]) -> L
         network_log_file: Path to JSON file containing network log with requests
         oracle: Oracle instance for vulnerability checking
         users: List of users with their auth tokens
+        transport: Transport used to send requests, defaults to a pooled HTTPTransport
+        dedupe: Fuzz each distinct request signature once (see plan.plan_requests) instead
+            of every log entry. Results list every entry they cover in original_request_ids
+        exhaustive: Replay every request as every other user, naming the user in as_user
+        users_per_role: In exhaustive mode, only replay as a sample of this many users per role
+        rate_limit: Starting requests per second per host of an adaptive rate limiter that
+            backs off on 429/503 responses and resends them, or None to send without pacing
+        journal: Path of a SQLite results journal (see journal.ResultsJournal). Probes already
+            in it are skipped, so rerunning with the same arguments resumes an interrupted run.
+            Probes with a variant that was skipped for being throttled are fuzzed again
+        
+    Probes with a variant that was still throttled after every retry are fuzzed once more
+    after all other probes, and their reports come last. Their requests are held in memory
+    until then.
         
     Returns:
-        List of vulnerability reports
+        List of vulnerability reports, or with a journal, a JournalResults view that streams
+        every report in the journal, including those of earlier runs
     """
-    # Load network log
-    with open(network_log_file, 'r') as f:
-        network_log = json.load(f)
-    
-    fuzzer = AuthFuzzer(oracle, users)
+    results_journal = _open_journal(journal, users, dedupe, exhaustive, users_per_role)
+    fuzzer = AuthFuzzer(
+        oracle, users, transport, exhaustive=exhaustive, users_per_role=users_per_role, rate_limit=rate_limit
+    )
     all_results = []
+    deferred = []
     
-    # Process each request in the network log
-    for entry in network_log.get("requests", []):
-        if "request" in entry:
-            # Add request ID and timestamp to the request object
-            request = entry["request"]
-            request["id"] = entry["id"]
-            request["timestamp"] = entry["timestamp"]
-            
+    try:
+        for key, originals, request in _iter_requests_to_fuzz(network_log_file, oracle, users, dedupe):
+            if results_journal is not None and results_journal.is_done(key):
+                continue
             # Fuzz the request
-            results = fuzzer.fuzz_request(request)
-            
-            # Add original request metadata to results
-            for result in results:
-                result["original_request_id"] = entry["id"]
-                result["original_timestamp"] = entry["timestamp"]
-            
-            all_results.extend(results)
+            results, complete = fuzzer._fuzz_request(request)
+            if complete:
+                _collect_results(results_journal, all_results, key, _tag_results(results, originals), complete)
+            else:
+                deferred.append((key, originals, request))
+        
+        # Give probes with throttled variants another try once their hosts had time to recover
+        for key, originals, request in deferred:
+            results, complete = fuzzer._fuzz_request(request)
+            _collect_results(results_journal, all_results, key, _tag_results(results, originals), complete)
+    finally:
+        fuzzer.close()
+        if results_journal is not None:
+            results_journal.close()
+    
+    return JournalResults(journal) if journal else all_results
+
+async def _fuzz_in_window(
+    fuzzer: AsyncAuthFuzzer, probes: Iterable[Tuple[str, List[Dict], Dict]], window_size: int, on_done
+) -> None:
+    """Fuzz probes with a bounded window of them read ahead, passing each to on_done in order."""
+    window = deque()
+    try:
+        for key, originals, request in probes:
+            window.append((key, originals, request, asyncio.ensure_future(fuzzer._fuzz_request_async(request))))
+            if len(window) >= window_size:
+                key, originals, request, task = window.popleft()
+                on_done(key, originals, request, *await task)
+        
+        while window:
+            key, originals, request, task = window.popleft()
+            on_done(key, originals, request, *await task)
+    finally:
+        for _, _, _, task in window:
+            task.cancel()
+
+async def fuzz_requests_async(
+    network_log_file: str,
+    oracle: Oracle,
+    users: List[User],
+    max_concurrency: int = 32,
+    max_per_host: int = 8,
+    transport: Optional[Transport] = None,
+    dedupe: bool = True,
+    exhaustive: bool = False,
+    users_per_role: Optional[int] = None,
+    rate_limit: Optional[float] = None,
+    journal: Optional[str] = None
+) -> Iterable[Dict]:
+    """
+    Fuzz a corpus of requests concurrently over a shared connection pool.
+    
+    Args:
+        network_log_file: Path to JSON file containing network log with requests
+        oracle: Oracle instance for vulnerability checking
+        users: List of users with their auth tokens
+        max_concurrency: Maximum number of requests in flight overall
+        max_per_host: Maximum number of requests in flight to a single host
+        transport: Transport used to send requests, defaults to a pooled HTTPTransport
+        dedupe: Fuzz each distinct request signature once, as in fuzz_requests
+        exhaustive: Replay every request as every other user, as in fuzz_requests
+        users_per_role: In exhaustive mode, only replay as a sample of this many users per role
+        rate_limit: Starting requests per second per host of an adaptive rate limiter, as in fuzz_requests
+        journal: Path of a SQLite results journal to resume from and record to, as in fuzz_requests
+        
+    Returns:
+        Vulnerability reports, identical to and in the same order as fuzz_requests
+    """
+    results_journal = _open_journal(journal, users, dedupe, exhaustive, users_per_role)
+    fuzzer = AsyncAuthFuzzer(
+        oracle, users, max_concurrency=max_concurrency, max_per_host=max_per_host, transport=transport,
+        exhaustive=exhaustive, users_per_role=users_per_role, rate_limit=rate_limit
+    )
+    all_results = []
+    deferred = []
+    
+    def collect(key, originals, request, results, complete):
+        _collect_results(results_journal, all_results, key, _tag_results(results, originals), complete)
+    
+    def collect_or_defer(key, originals, request, results, complete):
+        if complete:
+            collect(key, originals, request, results, complete)
+        else:
+            deferred.append((key, originals, request))
+    
+    probes = (
+        (key, originals, request)
+        for key, originals, request in _iter_requests_to_fuzz(network_log_file, oracle, users, dedupe)
+        if results_journal is None or not results_journal.is_done(key)
+    )
+    try:
+        await _fuzz_in_window(fuzzer, probes, max_concurrency * 4, collect_or_defer)
+        # Give probes with throttled variants another try, as in fuzz_requests
+        await _fuzz_in_window(fuzzer, deferred, max_concurrency * 4, collect)
+    finally:
+        fuzzer.close()
+        if results_journal is not None:
+            results_journal.close()
     
-    return all_results
+    return JournalResults(journal) if journal else all_results
@@ -13,6 +13,7 @@ sys.path.insert(0, parent_dir)
 # Now import the modules
 from oracle.oracle import Oracle
 from oracle.permission_model import PermissionModel
+from oracle.network_log import iter_log_entries
 from fuzzer.fuzzer import User, fuzz_requests
 
 def decode_jwt(token: str) -> Dict:
@@ -42,14 +43,11 @@ def extract_users_from_log(network_log_file: str) -> List[User]:
     Returns:
         List of User objects with their roles and tokens
     """
-    with open(network_log_file, 'r') as f:
-        network_log = json.load(f)
-    
     # Track unique users and their tokens
     users_by_id: Dict[str, User] = {}
     
-    # Process each request in the log
-    for entry in network_log.get("requests", []):
+    # Stream each request from the log
+    for entry in iter_log_entries(network_log_file):
         request = entry.get("request", {})
         headers = request.get("headers", {})
         response = entry.get("response", {})
@@ -126,7 +124,11 @@ def main():
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable must be set")
     
-    permission_model = PermissionModel(api_key=api_key)
+    # Reuse the matrix generated for identical inputs; set REFRESH_PERMISSIONS=1 to regenerate it
+    permission_model = PermissionModel(
+        api_key=api_key,
+        cache_dir=os.path.join(current_dir, ".permission_cache")
+    )
     permission_model.load_data(
         openapi_path=openapi_file,
         network_log_path=network_log_file,
@@ -135,7 +137,7 @@ def main():
     
     # Generate the permission matrix
     print("\nGenerating permission matrix...")
-    permission_model.generate_permission_matrix()
+    permission_model.generate_permission_matrix(refresh=os.environ.get("REFRESH_PERMISSIONS") == "1")
     
     oracle = Oracle(permission_model)
     
@@ -0,0 +1,133 @@
+import json
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS probes (
+    probe TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    probe TEXT NOT NULL,
+    test_case TEXT NOT NULL,
+    as_user TEXT,
+    status INTEGER,
+    is_vulnerable INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_vulnerable ON results (is_vulnerable);
+CREATE INDEX IF NOT EXISTS results_probe ON results (probe);
+"""
+
+class ResultsJournal:
+    def __init__(self, path: str, batch_size: int = 100, settings: Optional[Dict[str, Any]] = None):
+        """
+        Open or create a SQLite journal of completed probes and their results.
+
+        A probe only counts as done once all of its results are committed, so a run
+        killed mid-batch sends the uncommitted probes again when it is restarted.
+
+        Args:
+            path: Path of the SQLite database
+            batch_size: Number of probes recorded per transaction
+            settings: Settings of the run that produced the results, such as the fuzzing mode.
+                A journal recorded with other settings raises ValueError instead of being resumed
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: List[Tuple[str, List[Dict], bool]] = []
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, a crash can lose the last transactions but never corrupt the journal
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        if settings is not None:
+            self._check_settings(settings)
+
+    def _check_settings(self, settings: Dict[str, Any]) -> None:
+        row = self._connection.execute("SELECT settings FROM settings").fetchone()
+        if row is None:
+            with self._connection:
+                self._connection.execute("INSERT INTO settings (settings) VALUES (?)", (json.dumps(settings),))
+        elif json.loads(row[0]) != settings:
+            self._connection.close()
+            raise ValueError(f"Journal {self.path} was recorded with settings {row[0]}, not {json.dumps(settings)}")
+
+    def is_done(self, probe: str) -> bool:
+        """Whether a probe's results are already in the journal."""
+        if any(key == probe and complete for key, _, complete in self._pending):
+            return True
+        row = self._connection.execute("SELECT 1 FROM probes WHERE probe = ?", (probe,)).fetchone()
+        return row is not None
+
+    def record(self, probe: str, results: List[Dict], complete: bool = True) -> None:
+        """
+        Queue a probe's results, writing them once a batch is full.
+
+        A probe that is not complete, because some of its variants could not be sent, keeps
+        its results in the journal but is not done, so a resumed run fuzzes it again and its
+        new results replace these.
+        """
+        self._pending.append((probe, results, complete))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write queued probes in a single transaction."""
+        if not self._pending:
+            return
+        with self._connection:
+            # Drop results of an earlier, incomplete attempt at the same probes
+            self._connection.executemany(
+                "DELETE FROM results WHERE probe = ?",
+                ((probe,) for probe, _, _ in self._pending)
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO probes (probe) VALUES (?)",
+                ((probe,) for probe, _, complete in self._pending if complete)
+            )
+            self._connection.executemany(
+                "INSERT INTO results (probe, test_case, as_user, status, is_vulnerable, result) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        probe,
+                        result["test_case"],
+                        result.get("as_user"),
+                        result["response"].get("status"),
+                        int(bool(result["is_vulnerable"])),
+                        json.dumps(result)
+                    )
+                    for probe, results, _ in self._pending for result in results
+                )
+            )
+        self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+def iter_journal_results(path: str, vulnerable_only: bool = False) -> Iterator[Dict]:
+    """Stream the results of a journal one at a time, in the order they were recorded."""
+    query = "SELECT result FROM results"
+    if vulnerable_only:
+        query += " WHERE is_vulnerable = 1"
+    connection = sqlite3.connect(path)
+    try:
+        for (result,) in connection.execute(query + " ORDER BY seq"):
+            yield json.loads(result)
+    finally:
+        connection.close()
+
+class JournalResults:
+    """Re-iterable view of the results in a journal that streams them on every pass."""
+
+    def __init__(self, path: str, vulnerable_only: bool = False):
+        self.path = path
+        self.vulnerable_only = vulnerable_only
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter_journal_results(self.path, self.vulnerable_only)
@@ -0,0 +1,105 @@
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+from oracle.oracle import Oracle
+
+@dataclass
+class PlannedProbe:
+    """One distinct request to fuzz, standing in for every log entry with the same signature."""
+    signature: Tuple
+    entry_id: Any
+    original_requests: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        """Number of original log entries this probe covers."""
+        return len(self.original_requests)
+
+    def to_dict(self) -> Dict:
+        return {
+            "signature": list(self.signature),
+            "count": self.count,
+            "entry_id": self.entry_id,
+            "original_requests": self.original_requests
+        }
+
+def _body_hash(body: Any) -> Optional[str]:
+    if body is None:
+        return None
+    text = body if isinstance(body, str) else json.dumps(body, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def request_signature(request: Dict, oracle: Oracle, user_ids: Dict[str, str]) -> Tuple:
+    """
+    Normalize a request to (method, template, path params, query, body hash, acting user).
+
+    Requests whose path matches no OpenAPI template keep their concrete path as the template.
+    The acting user is the id of the user owning the auth token, or the token itself if unknown.
+    """
+    parsed = urlparse(request["url"])
+    resolved = oracle.resolve_path(request["url"])
+    template, params = resolved if resolved else (parsed.path, {})
+
+    auth = request.get("headers", {}).get("authorization")
+    if auth and auth.startswith("Bearer "):
+        auth = auth[7:]
+
+    return (
+        request["method"].upper(),
+        template,
+        tuple(sorted(params.items())),
+        tuple(sorted(parse_qsl(parsed.query, keep_blank_values=True))),
+        _body_hash(request.get("body", request.get("post_data"))),
+        user_ids.get(auth, auth)
+    )
+
+def plan_requests(entries: Iterable[Dict], oracle: Oracle, users: Iterable) -> List[PlannedProbe]:
+    """
+    Collapse log entries into one probe per distinct request signature.
+
+    Probes keep the order in which their signature first appeared in the log, and the
+    first entry with a signature is the request that gets fuzzed. Only signatures and
+    entry ids are kept; iter_planned_requests reads the requests themselves back from the log.
+    """
+    user_ids = {user.auth_token: user.id for user in users}
+    probes: Dict[Tuple, PlannedProbe] = {}
+
+    for entry in entries:
+        if "request" not in entry:
+            continue
+        signature = request_signature(entry["request"], oracle, user_ids)
+        probe = probes.get(signature)
+        if probe is None:
+            probe = probes[signature] = PlannedProbe(signature, entry["id"])
+        probe.original_requests.append({"id": entry["id"], "timestamp": entry["timestamp"]})
+
+    return list(probes.values())
+
+def iter_planned_requests(plan: List[PlannedProbe], entries: Iterable[Dict]) -> Iterator[Tuple[PlannedProbe, Dict]]:
+    """
+    Pair each probe with its request, streamed from a second pass over the same log.
+
+    Probes come out in plan order, so only the request currently being fuzzed is held in memory.
+    """
+    probes = {probe.entry_id: probe for probe in plan}
+
+    for entry in entries:
+        probe = probes.pop(entry.get("id"), None)
+        if probe is None or "request" not in entry:
+            continue
+        # Add request ID and timestamp to the request object
+        request = entry["request"]
+        request["id"] = entry["id"]
+        request["timestamp"] = entry["timestamp"]
+        yield probe, request
+
+def save_plan(plan: List[PlannedProbe], path: str) -> None:
+    """Write a fuzz plan as JSON, with totals of original entries and distinct probes."""
+    with open(path, "w") as f:
+        json.dump({
+            "total_entries": sum(probe.count for probe in plan),
+            "total_probes": len(plan),
+            "probes": [probe.to_dict() for probe in plan]
+        }, f, indent=2)
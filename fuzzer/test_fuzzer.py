@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Add parent directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from oracle.oracle import Oracle
+from oracle.permission_model import PermissionModel
+from oracle.network_log import iter_log_entries
+from fuzzer.fuzzer import User, AuthFuzzer, AsyncAuthFuzzer, fuzz_requests, fuzz_requests_async
+from fuzzer.journal import iter_journal_results
+from fuzzer.plan import iter_planned_requests, plan_requests
+from fuzzer.transport import HostRateLimiter, HTTPTransport, RateLimitedTransport, ThrottledError, Transport
+
+class FakeTransport(Transport):
+    """In-process transport that answers every request with a canned response."""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.sent = []
+
+    def send(self, method, url, headers, body=None):
+        self.sent.append((method, url, dict(headers), body))
+        return {
+            "status": self.status,
+            "body": {"url": url},
+            "headers": {"content-type": "application/json"},
+            "timing": {"connect": 0.0, "ttfb": 0.001, "total": 0.002}
+        }
+
+class CountingAsyncAuthFuzzer(AsyncAuthFuzzer):
+    """Async fuzzer that records how many requests are in flight instead of sending them."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.in_flight = {}
+        self.peak_per_host = {}
+        self.peak_total = 0
+        self.hosts_sent = []
+
+    def _send_request(self, request, once=False):
+        host = request["url"].split("/")[2]
+        with self._lock:
+            self.hosts_sent.append(host)
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.peak_per_host[host] = max(self.peak_per_host.get(host, 0), self.in_flight[host])
+            self.peak_total = max(self.peak_total, sum(self.in_flight.values()))
+        time.sleep(0.05)
+        with self._lock:
+            self.in_flight[host] -= 1
+        return {"status": 200, "body": None, "headers": {}}
+
+class TestAsyncAuthFuzzer(unittest.TestCase):
+    def setUp(self):
+        self.oracle = mock.Mock()
+        self.oracle.check_violation.return_value = False
+        self.users = [
+            User(id="1", role="patient", auth_token="alice"),
+            User(id="2", role="patient", auth_token="bob"),
+            User(id="3", role="doctor", auth_token="carol")
+        ]
+
+    def _request(self, host):
+        return {"url": f"http://{host}/api/users/1", "method": "GET", "headers": {"authorization": "Bearer alice"}}
+
+    def test_concurrency_limits(self):
+        """Test that the per-host limit holds without a busy host starving the others of global slots"""
+        fuzzer = CountingAsyncAuthFuzzer(self.oracle, self.users, max_concurrency=2, max_per_host=1)
+
+        async def run():
+            return await asyncio.gather(*(
+                fuzzer.fuzz_request_async(self._request(host)) for host in ["a.test", "a.test", "b.test"]
+            ))
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            fuzzer.close()
+
+        self.assertEqual([len(r) for r in results], [3, 3, 3])
+        self.assertEqual(fuzzer.peak_per_host, {"a.test": 1, "b.test": 1})
+        self.assertEqual(fuzzer.peak_total, 2)
+        # b.test is served alongside the first a.test variant, not after all six of them
+        self.assertEqual(fuzzer.hosts_sent[:2], ["a.test", "b.test"])
+
+    def test_throttled_host_does_not_hold_slots(self):
+        """Test that a variant backing off from a throttling host lets requests to other hosts through"""
+        start = time.monotonic()
+        
+        class SlowThrottlingTransport(FakeTransport):
+            def send(self, method, url, headers, body=None):
+                response = super().send(method, url, headers, body)
+                if len(self.sent) == 1:
+                    response.update(status=429, headers={"Retry-After": "0.5"})
+                return response
+        
+        inner = SlowThrottlingTransport()
+        transport = RateLimitedTransport(inner, rate=1000.0, max_rate=1000.0)
+        fuzzer = AsyncAuthFuzzer(self.oracle, self.users, max_concurrency=1, max_per_host=1, transport=transport)
+        
+        sent_at = {}
+        send = inner.send
+        def timed_send(method, url, headers, body=None):
+            sent_at.setdefault(url.split("/")[2], []).append(time.monotonic() - start)
+            return send(method, url, headers, body)
+        inner.send = timed_send
+        
+        async def run():
+            return await asyncio.gather(*(fuzzer.fuzz_request_async(self._request(host)) for host in ["a.test", "b.test"]))
+        
+        try:
+            results = asyncio.run(run())
+        finally:
+            fuzzer.close()
+        
+        self.assertEqual([len(r) for r in results], [3, 3])
+        self.assertEqual(len(sent_at["a.test"]), 4)
+        # b.test is not kept waiting while the throttled a.test variant backs off
+        self.assertLess(max(sent_at["b.test"]), 0.4)
+        self.assertGreaterEqual(max(sent_at["a.test"]), 0.5)
+
+    def test_does_not_keep_cookies(self):
+        """Test that a cookie set by one response is not sent with later variants"""
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps({"cookie": self.headers.get("Cookie")}).encode()
+                self.send_response(200)
+                if self.path == "/login":
+                    self.send_header("Set-Cookie", "session_token=alice; Path=/")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        fuzzer = AuthFuzzer(self.oracle, self.users)
+        fuzzer._send_request({"url": f"{base}/login", "method": "GET", "headers": {}})
+        response = fuzzer._send_request({"url": f"{base}/api/users/1", "method": "GET", "headers": {}})
+        self.assertEqual(response["body"], {"cookie": None})
+
+class TestAuthFuzzer(unittest.TestCase):
+    def setUp(self):
+        self.permission_model = PermissionModel(api_key="test-key")
+        self.permission_model.openapi_spec = {
+            "paths": {
+                "/api/users/{id}": {"get": {"operationId": "getUser"}}
+            }
+        }
+        self.permission_model.permissions_df = pd.DataFrame([
+            {"user": "alice", "object": "users[1]", "method": "GET", "value": True},
+            {"user": "bob", "object": "users[1]", "method": "GET", "value": False},
+            {"user": "carol", "object": "users[1]", "method": "GET", "value": False}
+        ])
+        self.oracle = Oracle(self.permission_model)
+        self.users = [
+            User(id="1", role="patient", auth_token="alice"),
+            User(id="2", role="patient", auth_token="bob"),
+            User(id="3", role="doctor", auth_token="carol")
+        ]
+        self.request = {
+            "id": 1,
+            "timestamp": "2025-02-16T05:42:50",
+            "url": "http://localhost:3000/api/users/1",
+            "method": "GET",
+            "headers": {"authorization": "Bearer alice"}
+        }
+
+    def test_fuzz_request_with_fake_transport(self):
+        """Test that every variant goes through the injected transport"""
+        transport = FakeTransport()
+        fuzzer = AuthFuzzer(self.oracle, self.users, transport=transport)
+        results = fuzzer.fuzz_request(self.request)
+
+        self.assertEqual([r["test_case"] for r in results], ["no_auth", "same_role", "different_role"])
+        self.assertEqual(len(transport.sent), 3)
+        self.assertNotIn("authorization", transport.sent[0][2])
+        self.assertEqual(transport.sent[1][2]["authorization"], "Bearer bob")
+        self.assertTrue(results[1]["is_vulnerable"])
+        self.assertEqual(results[1]["timing"]["total"], 0.002)
+        self.assertNotIn("timing", results[1]["response"])
+
+    def test_variants_share_the_original_request(self):
+        """Test that variants only replace authentication and leave the original request untouched"""
+        request = dict(self.request, body={"items": list(range(1000))})
+        fuzzer = AuthFuzzer(self.oracle, self.users, transport=FakeTransport())
+        self.assertIs(fuzzer._extract_auth_info(request), self.users[0])
+        
+        variant = fuzzer._create_request_variant(request, "carol")
+        self.assertIs(variant["body"], request["body"])
+        self.assertEqual(variant["headers"], {"authorization": "Bearer carol"})
+        self.assertEqual(variant["path"], "/api/users/1")
+        self.assertEqual(request["headers"], {"authorization": "Bearer alice"})
+        self.assertNotIn("path", request)
+        with self.assertRaises(TypeError):
+            variant["body"] = None
+        self.assertEqual(json.loads(json.dumps(variant.to_dict()))["url"], request["url"])
+
+    def test_async_results_match_serial(self):
+        """Test that the async engine produces the same results in the same order"""
+        serial = AuthFuzzer(self.oracle, self.users, transport=FakeTransport())
+        expected = serial.fuzz_request(dict(self.request))
+
+        fuzzer = AsyncAuthFuzzer(self.oracle, self.users, max_concurrency=2, max_per_host=1,
+                                 transport=FakeTransport())
+        try:
+            results = asyncio.run(fuzzer.fuzz_request_async(dict(self.request)))
+        finally:
+            fuzzer.close()
+
+        self.assertEqual(results, expected)
+
+    def test_exhaustive_replays_as_every_user(self):
+        """Test that exhaustive mode tries every other user and can sample users per role"""
+        users = self.users + [User(id="4", role="doctor", auth_token="dave")]
+        fuzzer = AuthFuzzer(self.oracle, users, transport=FakeTransport(), exhaustive=True)
+        results = fuzzer.fuzz_request(dict(self.request))
+        self.assertEqual([r["as_user"] for r in results], [None, "2", "3", "4"])
+        self.assertEqual([r["test_case"] for r in results], ["no_auth", "same_role", "different_role", "different_role"])
+        
+        sampled = AuthFuzzer(self.oracle, users, transport=FakeTransport(), exhaustive=True, users_per_role=1)
+        self.assertEqual(sorted(user.role for user in sampled.matrix_users), ["doctor", "patient"])
+        
+        fuzzer = AsyncAuthFuzzer(self.oracle, users, max_concurrency=2, max_per_host=1,
+                                 transport=FakeTransport(), exhaustive=True)
+        async def fuzz_concurrently():
+            return await asyncio.gather(*(fuzzer.fuzz_request_async(dict(self.request)) for _ in range(3)))
+        try:
+            self.assertEqual(asyncio.run(fuzz_concurrently()), [results] * 3)
+        finally:
+            fuzzer.close()
+
+    def _write_log(self, entries):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"metadata": {}, "requests": entries}, f)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_duplicate_requests_are_fuzzed_once(self):
+        """Test that identical log entries collapse into one probe that maps back to all of them"""
+        entries = [
+            {"id": i, "timestamp": f"2025-02-16T05:42:5{i}", "request": dict(self.request, headers=dict(self.request["headers"]))}
+            for i in range(1, 4)
+        ]
+        entries.append({"id": 4, "timestamp": "2025-02-16T05:42:54",
+                        "request": dict(self.request, url="http://localhost:3000/api/users/2",
+                                        headers={"authorization": "Bearer alice"})})
+        path = self._write_log(entries)
+        
+        plan = plan_requests(iter_log_entries(path), self.oracle, self.users)
+        self.assertEqual([probe.count for probe in plan], [3, 1])
+        self.assertEqual(plan[0].signature[:3], ("GET", "/api/users/{id}", (("id", "1"),)))
+        self.assertEqual([probe.entry_id for probe in plan], [1, 4])
+        planned = list(iter_planned_requests(plan, iter_log_entries(path)))
+        self.assertEqual([(probe.entry_id, request["id"]) for probe, request in planned], [(1, 1), (4, 4)])
+        
+        transport = FakeTransport()
+        results = fuzz_requests(path, self.oracle, self.users, transport=transport)
+        self.assertEqual(len(transport.sent), 6)
+        self.assertEqual(results[0]["original_request_ids"], [1, 2, 3])
+        self.assertEqual(results[0]["original_request_id"], 1)
+        self.assertEqual(results[-1]["original_request_ids"], [4])
+        
+        transport = FakeTransport()
+        fuzz_requests(path, self.oracle, self.users, transport=transport, dedupe=False)
+        self.assertEqual(len(transport.sent), 12)
+
+    def test_journaled_run_resumes(self):
+        """Test that an interrupted run keeps its finished probes and a rerun only sends the rest"""
+        entries = [
+            {"id": i, "timestamp": f"2025-02-16T05:42:5{i}",
+             "request": dict(self.request, url=f"http://localhost:3000/api/users/{i}", headers={"authorization": "Bearer alice"})}
+            for i in range(1, 3)
+        ]
+        path = self._write_log(entries)
+        journal = path + ".sqlite"
+        self.addCleanup(lambda: [os.remove(journal + suffix) for suffix in ("", "-wal", "-shm") if os.path.exists(journal + suffix)])
+        
+        class InterruptedTransport(FakeTransport):
+            def send(self, method, url, headers, body=None):
+                if url.endswith("/2"):
+                    raise KeyboardInterrupt
+                return super().send(method, url, headers, body)
+        
+        with self.assertRaises(KeyboardInterrupt):
+            fuzz_requests(path, self.oracle, self.users, transport=InterruptedTransport(), journal=journal)
+        self.assertEqual([r["original_request_id"] for r in iter_journal_results(journal)], [1, 1, 1])
+        
+        transport = FakeTransport()
+        results = fuzz_requests(path, self.oracle, self.users, transport=transport, journal=journal)
+        self.assertEqual(len(transport.sent), 3)
+        expected = fuzz_requests(path, self.oracle, self.users, transport=FakeTransport())
+        self.assertEqual(list(results), json.loads(json.dumps(expected)))
+        self.assertEqual(list(results), list(results))
+        self.assertEqual(len(list(iter_journal_results(journal, vulnerable_only=True))),
+                         sum(r["is_vulnerable"] for r in expected))
+
+    def test_journal_retries_throttled_probes(self):
+        """Test that a probe with a throttled variant is fuzzed again, and other settings are refused"""
+        path = self._write_log([{"id": 1, "timestamp": "2025-02-16T05:42:51", "request": dict(self.request)}])
+        journal = path + ".sqlite"
+        self.addCleanup(lambda: [os.remove(journal + suffix) for suffix in ("", "-wal", "-shm") if os.path.exists(journal + suffix)])
+        
+        # no_auth is throttled in the main pass and again in the deferred retry pass
+        inner = ThrottlingTransport(throttled=4)
+        transport = RateLimitedTransport(inner, rate=1000.0, max_throttle_retries=0)
+        results = fuzz_requests(path, self.oracle, self.users, transport=transport, journal=journal)
+        self.assertEqual(len(inner.sent), 6)
+        self.assertEqual([r["test_case"] for r in results], ["same_role", "different_role"])
+        
+        transport = FakeTransport()
+        results = fuzz_requests(path, self.oracle, self.users, transport=transport, journal=journal)
+        self.assertEqual(len(transport.sent), 3)
+        self.assertEqual([r["test_case"] for r in results], ["no_auth", "same_role", "different_role"])
+        
+        with self.assertRaises(ValueError):
+            fuzz_requests(path, self.oracle, self.users, transport=FakeTransport(), journal=journal, exhaustive=True)
+
+    def test_throttled_probes_are_retried_after_the_rest(self):
+        """Test that a probe with a variant throttled past its retries is fuzzed again at the end of the run"""
+        entries = [
+            {"id": i, "timestamp": f"2025-02-16T05:42:5{i}",
+             "request": dict(self.request, url=f"http://localhost:3000/api/users/{i}", headers={"authorization": "Bearer alice"})}
+            for i in range(1, 3)
+        ]
+        path = self._write_log(entries)
+        
+        for fuzz in (fuzz_requests, lambda *args, **kwargs: asyncio.run(fuzz_requests_async(*args, max_concurrency=1, **kwargs))):
+            inner = ThrottlingTransport(throttled=1)
+            transport = RateLimitedTransport(inner, rate=1000.0, max_throttle_retries=0)
+            results = fuzz(path, self.oracle, self.users, transport=transport)
+            self.assertEqual(len(inner.sent), 9)
+            self.assertEqual([r["original_request_id"] for r in results], [2, 2, 2, 1, 1, 1])
+            self.assertEqual([r["test_case"] for r in results[3:]], ["no_auth", "same_role", "different_role"])
+
+class TestHTTPTransport(unittest.TestCase):
+    def test_retries_connection_errors(self):
+        """Test that connection errors are retried with backoff before giving up"""
+        transport = HTTPTransport(max_retries=2, backoff_factor=0)
+        with mock.patch.object(transport.session, "request",
+                               side_effect=requests.ConnectionError("refused")) as request:
+            with self.assertRaises(requests.ConnectionError):
+                transport.send("GET", "http://localhost:1/api/users/1", {})
+        self.assertEqual(request.call_count, 3)
+        transport.close()
+
+    def test_retries_only_unsent_non_idempotent_requests(self):
+        """Test that a POST is retried if it could not connect, but not if the connection dropped after sending"""
+        transport = HTTPTransport(max_retries=2, backoff_factor=0)
+        self.addCleanup(transport.close)
+        dropped = requests.ConnectionError("Connection aborted: RemoteDisconnected")
+        with mock.patch.object(transport.session, "request", side_effect=dropped) as request:
+            with self.assertRaises(requests.ConnectionError):
+                transport.send("POST", "http://localhost:1/api/users", {}, {"username": "mallory"})
+        self.assertEqual(request.call_count, 1)
+        
+        refused = requests.ConnectionError(MaxRetryError(None, "/api/users", NewConnectionError(None, "refused")))
+        with mock.patch.object(transport.session, "request", side_effect=refused) as request:
+            with self.assertRaises(requests.ConnectionError):
+                transport.send("POST", "http://localhost:1/api/users", {}, {"username": "mallory"})
+        self.assertEqual(request.call_count, 3)
+
+    def test_does_not_keep_cookies(self):
+        """Test that a cookie set by one response is not sent with later requests"""
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps({"cookie": self.headers.get("Cookie")}).encode()
+                self.send_response(200)
+                if self.path == "/login":
+                    self.send_header("Set-Cookie", "session_token=alice; Path=/")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+        
+        transport = HTTPTransport()
+        self.addCleanup(transport.close)
+        transport.send("GET", f"{base}/login", {})
+        self.assertEqual(transport.send("GET", f"{base}/api/users/1", {})["body"], {"cookie": None})
+
+class ThrottlingTransport(FakeTransport):
+    """Fake transport that answers the first requests with 429 Too Many Requests."""
+
+    def __init__(self, throttled):
+        super().__init__()
+        self.throttled = throttled
+
+    def send(self, method, url, headers, body=None):
+        response = super().send(method, url, headers, body)
+        if len(self.sent) <= self.throttled:
+            response.update(status=429, headers={"Retry-After": "0"})
+        return response
+
+class TestRateLimitedTransport(unittest.TestCase):
+    def test_rate_adapts_to_responses(self):
+        """Test that the rate grows additively while healthy and halves when throttled"""
+        limiter = HostRateLimiter(rate=10.0)
+        for _ in range(10):
+            limiter.on_response(200, 0.01)
+        self.assertAlmostEqual(limiter.rate, 11.0, delta=0.1)
+        
+        limiter.on_response(429, 0.01, retry_after=0)
+        limiter.on_response(429, 0.01, retry_after=0)
+        self.assertAlmostEqual(limiter.rate, 5.5, delta=0.1)
+
+    def test_throttled_requests_are_resent(self):
+        """Test that 429 responses are retried instead of returned, up to a limit"""
+        inner = ThrottlingTransport(throttled=2)
+        transport = RateLimitedTransport(inner, rate=1000.0, max_rate=1000.0)
+        response = transport.send("GET", "http://localhost:3000/api/users/1", {})
+        self.assertEqual(response["status"], 200)
+        self.assertEqual(len(inner.sent), 3)
+        self.assertLess(transport.limiter_for("http://localhost:3000/").rate, 1000.0)
+        
+        transport = RateLimitedTransport(ThrottlingTransport(throttled=10), rate=1000.0, max_throttle_retries=1)
+        with self.assertRaises(ThrottledError):
+            transport.send("GET", "http://localhost:3000/api/users/1", {})
+
+if __name__ == '__main__':
+    unittest.main()
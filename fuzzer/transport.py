@@ -0,0 +1,331 @@
+import time
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import NewConnectionError
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Methods that leave the server in the same state however many times they are sent
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"})
+
+# Connection setup time of the request currently being sent on this thread
+_connect_timer = threading.local()
+
+# Statuses with which a host sheds load, so requests answered with them are retried later
+THROTTLE_STATUSES = (429, 503)
+
+# Latencies below this never count as a host slowing down, however fast it was before
+MIN_SLOW_LATENCY = 0.05
+
+class ThrottledError(Exception):
+    """Raised when a host still throttles a request after every retry."""
+
+def _retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header given in seconds or as an HTTP date."""
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timer.elapsed = getattr(_connect_timer, "elapsed", 0.0) + time.perf_counter() - start
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timer.elapsed = getattr(_connect_timer, "elapsed", 0.0) + time.perf_counter() - start
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long TCP/TLS setup took."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+class Transport:
+    """
+    Interface used by the fuzzer to send requests.
+
+    Implementations return a response dict with:
+    - status: HTTP status code
+    - body: Parsed JSON body, the text of a non-JSON body, or None if the body is empty
+    - headers: Response headers
+    - timing: Dict with connect, ttfb and total durations in seconds
+    """
+
+    def send(self, method: str, url: str, headers: Dict[str, str], body: Optional[Any] = None) -> Dict:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class HTTPTransport(Transport):
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_factor: float = 0.5
+    ):
+        """
+        Initialize a keep-alive transport backed by a pooled requests.Session.
+
+        Args:
+            pool_size: Maximum number of pooled connections per host
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait for the server to send data
+            max_retries: Number of times to retry a request after a connection error. Requests
+                with other methods than IDEMPOTENT_METHODS are only retried if the connection
+                failed before they were sent, so a POST never reaches the server twice
+            backoff_factor: Base delay in seconds, doubled after every retry
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        adapter = _TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        # Every request carries exactly the auth it was given, so never keep cookies a
+        # response set for later requests, which may be sent as another user or none
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method: str, url: str, headers: Dict[str, str], body: Optional[Any]) -> Dict:
+        """Send a single attempt and time its phases."""
+        _connect_timer.elapsed = 0.0
+        start = time.perf_counter()
+
+        # Stream so the call returns once headers arrive, then read the body separately
+        response = self.session.request(
+            method=method,
+            url=url,
+            headers=headers,
+            json=body if body else None,
+            timeout=self.timeout,
+            stream=True
+        )
+        ttfb = time.perf_counter() - start
+        response.content
+        total = time.perf_counter() - start
+
+        body = None
+        if response.text:
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+
+        return {
+            "status": response.status_code,
+            "body": body,
+            "headers": dict(response.headers),
+            "timing": {
+                "connect": _connect_timer.elapsed,
+                "ttfb": ttfb,
+                "total": total
+            }
+        }
+
+    def send(self, method: str, url: str, headers: Dict[str, str], body: Optional[Any] = None) -> Dict:
+        """Send a request, retrying with exponential backoff on connection errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request(method, url, headers, body)
+            except requests.ConnectionError as e:
+                if attempt == self.max_retries:
+                    raise
+                # The server may already have acted on a request the connection dropped after
+                if method.upper() not in IDEMPOTENT_METHODS and not _failed_before_sending(e):
+                    raise
+                time.sleep(self.backoff_factor * (2 ** attempt))
+
+    def close(self) -> None:
+        self.session.close()
+
+def _failed_before_sending(error: requests.ConnectionError) -> bool:
+    """Whether a connection error happened while connecting, before any of the request was sent."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class HostRateLimiter:
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 5,
+        min_rate: float = 0.5,
+        max_rate: float = 200.0,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0
+    ):
+        """
+        Initialize a token bucket for one host whose rate adapts to the host's responses,
+        increasing additively while it is healthy and decreasing multiplicatively when it
+        throttles or slows down.
+
+        Args:
+            rate: Starting rate in requests per second
+            burst: Maximum number of requests sent back to back after an idle period
+            min_rate: Lowest rate the limiter backs off to
+            max_rate: Highest rate the limiter grows to
+            increase: Requests per second added for every second of healthy responses
+            decrease: Factor the rate is multiplied by when the host throttles or slows down
+            latency_factor: Latency, as a multiple of the lowest seen, above which the host
+                counts as slowing down
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._latency: Optional[float] = None  # Moving average of response latency
+        self._baseline: Optional[float] = None  # Lowest moving average seen
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token if a request may be sent to the host now, returning 0, or else the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if now >= self._blocked_until and self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+
+    def acquire(self) -> None:
+        """Block until a request may be sent to the host."""
+        wait = self.try_acquire()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    def _back_off(self, now: float) -> None:
+        # Responses to requests sent at the old rate keep arriving for about one round trip,
+        # so only back off once per round trip
+        if now - self._last_decrease < max(self._latency or 0.0, 1.0 / self.rate):
+            return
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._last_decrease = now
+
+    def on_response(self, status: int, latency: float, retry_after: Optional[float] = None) -> None:
+        """Adapt the rate to a response and, if the host asked for it, pause sending."""
+        with self._lock:
+            now = time.monotonic()
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            self._baseline = self._latency if self._baseline is None else min(self._baseline, self._latency)
+
+            if status in THROTTLE_STATUSES:
+                if retry_after is not None:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._back_off(now)
+            elif self._latency > self.latency_factor * max(self._baseline, MIN_SLOW_LATENCY):
+                self._back_off(now)
+            else:
+                # Adding increase / rate per response adds about increase per second
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+class RateLimitedTransport(Transport):
+    def __init__(
+        self,
+        transport: Transport,
+        rate: float = 10.0,
+        max_rate: float = 200.0,
+        max_throttle_retries: int = 5
+    ):
+        """
+        Initialize a transport that paces requests to each host with a HostRateLimiter.
+
+        Requests answered with 429 or 503 are sent again once the limiter allows it,
+        after any Retry-After delay, instead of being returned.
+
+        Args:
+            transport: Transport that sends the requests
+            rate: Starting rate per host in requests per second
+            max_rate: Highest rate per host in requests per second
+            max_throttle_retries: Number of times to resend a throttled request before
+                raising ThrottledError
+        """
+        self.transport = transport
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_throttle_retries = max_throttle_retries
+        self.limiters: Dict[str, HostRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, url: str) -> HostRateLimiter:
+        """Get the limiter shared by all requests to the URL's host."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostRateLimiter(rate=self.rate, max_rate=self.max_rate)
+            return self.limiters[host]
+
+    def send_once(self, method: str, url: str, headers: Dict[str, str], body: Optional[Any] = None) -> Dict:
+        """
+        Send a request once, for a caller that already took a token from limiter_for(url).
+
+        Raises ThrottledError if the host throttles the request.
+        """
+        limiter = self.limiter_for(url)
+        start = time.perf_counter()
+        response = self.transport.send(method, url, headers, body)
+        limiter.on_response(
+            response["status"], time.perf_counter() - start, _retry_after(response.get("headers", {}))
+        )
+        if response["status"] in THROTTLE_STATUSES:
+            raise ThrottledError(f"{method.upper()} {url} was throttled with status {response['status']}")
+        return response
+
+    def send(self, method: str, url: str, headers: Dict[str, str], body: Optional[Any] = None) -> Dict:
+        """Send a request within its host's rate, resending it while the host throttles it."""
+        limiter = self.limiter_for(url)
+        for _ in range(self.max_throttle_retries + 1):
+            limiter.acquire()
+            try:
+                return self.send_once(method, url, headers, body)
+            except ThrottledError:
+                pass
+        raise ThrottledError(
+            f"{method.upper()} {url} was still throttled after {self.max_throttle_retries} retries"
+        )
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,63 @@
+import os
+import gzip
+import hashlib
+from typing import Any, Dict, Optional, Set, Union
+
+class BodyStore:
+    def __init__(self, root: str, max_body_bytes: Optional[int] = None, compresslevel: int = 6):
+        """
+        Initialize a content-addressed store of gzip-compressed request and response bodies.
+
+        Args:
+            root: Directory holding one blob per distinct body, named by its SHA-256
+            max_body_bytes: Bodies longer than this are cut to this many bytes before being stored,
+                or None to store them whole
+            compresslevel: gzip compression level
+        """
+        self.root = root
+        self.max_body_bytes = max_body_bytes
+        self.compresslevel = compresslevel
+        self._known: Set[str] = set()  # Digests already on disk, so repeated bodies skip the filesystem
+
+    @staticmethod
+    def is_ref(value: Any) -> bool:
+        """Whether a logged body is a reference into a body store rather than the body itself."""
+        return isinstance(value, dict) and isinstance(value.get('$blob'), str)
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest[2:]}.gz")
+
+    def put(self, body: Union[str, bytes], content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a body and return the reference logged in its place:
+        {'$blob': digest, 'size': original size in bytes, 'content_type': ..., 'truncated': bool}
+        """
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        size = len(data)
+        truncated = self.max_body_bytes is not None and size > self.max_body_bytes
+        if truncated:
+            data = data[:self.max_body_bytes]
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self._known:
+            path = self.path_for(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write to a temporary file first so readers never see a partial blob
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=self.compresslevel))
+                os.replace(tmp_path, path)
+            self._known.add(digest)
+
+        return {'$blob': digest, 'size': size, 'content_type': content_type, 'truncated': truncated}
+
+    def get_bytes(self, ref: Union[Dict[str, Any], str]) -> bytes:
+        """The stored bytes for a reference or digest. Truncated bodies come back truncated."""
+        digest = ref['$blob'] if isinstance(ref, dict) else ref
+        with open(self.path_for(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def get(self, ref: Union[Dict[str, Any], str]) -> str:
+        """The stored body for a reference or digest, decoded as text."""
+        return self.get_bytes(ref).decode('utf-8', errors='replace')
@@ -0,0 +1,370 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .body_store import BodyStore
+
+logger = logging.getLogger(__name__)
+
+# File extensions of newline-delimited logs, one JSON record per line
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+class _JSONStreamReader:
+    """Incrementally decodes a JSON document from a file without reading it all into memory."""
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Read another chunk into the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+        # Drop what has already been consumed so the buffer stays small
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        # Grow reads with the pending data so a value spanning many chunks is decoded in linear time
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in network log, found {found!r}")
+        self.pos += 1
+
+    def decode_value(self) -> Any:
+        """Decode the next complete JSON value, reading more data as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Only numbers are not self-delimiting, so one is complete once a delimiter follows it
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if not is_number or self.eof or (end < len(self.buffer) and self.buffer[end] in ',]} \t\r\n'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in network log, found {char!r}")
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield the keys of the object starting at the current position.
+
+        After each key the reader is positioned at its value, which the caller must consume.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or '}}' in network log, found {char!r}")
+
+def _is_ndjson(path: str) -> bool:
+    return os.path.splitext(path)[1] in NDJSON_EXTENSIONS
+
+def _segment_path(path: str, index: int) -> str:
+    """Path of a rotated segment, e.g. 'log.0001.ndjson' for index 1 of 'log.ndjson'."""
+    if index == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index:04d}{ext}"
+
+def _segment_paths(path: str) -> List[str]:
+    """The first segment of an NDJSON log followed by its rotated segments in order."""
+    root, ext = os.path.splitext(path)
+    directory = os.path.dirname(path) or '.'
+    pattern = re.compile(re.escape(os.path.basename(root)) + r'\.(\d{4,})' + re.escape(ext) + '$')
+    rotated = sorted(
+        (int(match.group(1)), name) for name in os.listdir(directory)
+        for match in [pattern.match(name)] if match
+    )
+    return [path] + [os.path.join(directory, name) for _, name in rotated]
+
+def _iter_ndjson_records(path: str) -> Iterator[Dict[str, Any]]:
+    for segment in _segment_paths(path):
+        with open(segment, 'r') as f:
+            for line in f:
+                record = line.strip()
+                if not record:
+                    continue
+                try:
+                    yield json.loads(record)
+                except json.JSONDecodeError:
+                    # Every complete record ends in a newline, so only a write cut short by a crash can lack one
+                    if line.endswith('\n'):
+                        raise
+                    logger.warning(f"Skipping torn last line of {segment}")
+
+def _drop_torn_line(path: str, chunk_size: int = 1 << 16) -> None:
+    """Cut an NDJSON segment back to its last complete line, dropping a line torn by a crash."""
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(end - 1, 0))
+        if end == 0 or f.read(1) == b'\n':
+            return
+        # Search backwards for the newline that ends the last complete line
+        while end > 0:
+            start = max(end - chunk_size, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                break
+            end = start
+        size = start + newline + 1 if end > 0 else 0
+        logger.warning(f"Dropping torn last line of {path}")
+        f.truncate(size)
+
+def _body_store_for(path: str) -> Optional[BodyStore]:
+    """The body store a log's metadata points to, relative to the log's directory."""
+    if _is_ndjson(path):
+        # The crawler writes the store location in the header line, so avoid scanning the whole log
+        with open(path, 'r') as f:
+            first = f.readline()
+        try:
+            header = json.loads(first) if first.strip() else {}
+        except json.JSONDecodeError:
+            # Only the header line was written before the crawl crashed
+            header = {}
+        metadata = header.get('metadata', {}) if set(header) == {'metadata'} else {}
+    else:
+        metadata = read_log_metadata(path)
+    if not metadata.get('body_store'):
+        return None
+    return BodyStore(os.path.join(os.path.dirname(path), metadata['body_store']))
+
+def _resolve_bodies(entry: Dict[str, Any], store: BodyStore) -> Dict[str, Any]:
+    """Replace body store references in an entry with the bodies they point to."""
+    entry = dict(entry)
+    request = entry.get('request')
+    if request is not None and BodyStore.is_ref(request.get('post_data')):
+        ref = request['post_data']
+        post_data = store.get(ref)
+        if 'json' in (ref.get('content_type') or '') and not ref['truncated']:
+            try:
+                post_data = json.loads(post_data)
+            except ValueError:
+                pass
+        entry['request'] = dict(request, post_data=post_data)
+    response = entry.get('response')
+    if response is not None and BodyStore.is_ref(response.get('body')):
+        entry['response'] = dict(response, body=store.get(response['body']))
+    return entry
+
+def _iter_raw_entries(path: str) -> Iterator[Dict[str, Any]]:
+    if _is_ndjson(path):
+        for record in _iter_ndjson_records(path):
+            if set(record) != {'metadata'}:
+                yield record
+        return
+
+    with open(path, 'r') as f:
+        reader = _JSONStreamReader(f)
+        if reader.peek() == '[':
+            yield from reader.iter_array()
+            return
+        for key in reader.iter_object():
+            if key == 'requests':
+                yield from reader.iter_array()
+            else:
+                reader.decode_value()
+
+def iter_log_entries(path: str, resolve_bodies: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the request entries of a network log one at a time.
+
+    Supports the crawler's JSON format ({'metadata': ..., 'requests': [...]}), a bare
+    JSON array of entries, and NDJSON files with one entry per line and an optional
+    {'metadata': ...} lines, including segments rotated by NetworkLogWriter.
+
+    Bodies the crawler moved to a body store are read back from it, unless
+    resolve_bodies is False, in which case entries keep the references.
+    """
+    store = None
+    located = False
+    for entry in _iter_raw_entries(path):
+        if resolve_bodies and (
+            BodyStore.is_ref(entry.get('request', {}).get('post_data'))
+            or BodyStore.is_ref(entry.get('response', {}).get('body'))
+        ):
+            if not located:
+                store = _body_store_for(path)
+                located = True
+            if store is not None:
+                entry = _resolve_bodies(entry, store)
+        yield entry
+
+def read_log_metadata(path: str) -> Dict[str, Any]:
+    """Read the metadata of a network log without loading its entries."""
+    if _is_ndjson(path):
+        # Metadata lines are merged, so totals written when the log was closed override the header
+        metadata = {}
+        for record in _iter_ndjson_records(path):
+            if set(record) == {'metadata'}:
+                metadata.update(record['metadata'])
+        return metadata
+
+    with open(path, 'r') as f:
+        reader = _JSONStreamReader(f)
+        if reader.peek() == '[':
+            return {}
+        for key in reader.iter_object():
+            if key == 'metadata':
+                return reader.decode_value()
+            if key == 'requests':
+                # Skip over the entries one at a time to reach metadata stored after them
+                for _ in reader.iter_array():
+                    pass
+            else:
+                reader.decode_value()
+    return {}
+
+def truncate_log(path: str, segment: int, size: int) -> None:
+    """Cut an NDJSON log back to a NetworkLogWriter.position, dropping everything written after it."""
+    for later_segment in _segment_paths(path)[segment + 1:]:
+        os.remove(later_segment)
+    os.truncate(_segment_path(path, segment), size)
+
+class NetworkLog:
+    """Re-iterable view of a network log file that streams its entries on every pass."""
+
+    def __init__(self, path: str, resolve_bodies: bool = True):
+        self.path = path
+        self.resolve_bodies = resolve_bodies
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_log_entries(self.path, self.resolve_bodies)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return read_log_metadata(self.path)
+
+def load_network_log(path: str) -> Dict[str, Any]:
+    """Load any supported network log into the crawler's {'metadata', 'requests'} shape."""
+    return {
+        'metadata': read_log_metadata(path),
+        'requests': list(iter_log_entries(path))
+    }
+
+class NetworkLogWriter:
+    def __init__(
+        self,
+        path: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        flush_interval: float = 1.0,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Initialize an append-only NDJSON network log.
+
+        Args:
+            path: Path of the first segment, ending in .ndjson or .jsonl
+            metadata: Metadata written as the first line
+            flush_interval: Seconds between flushes to disk with fsync
+            max_bytes: Size after which writing continues in a new segment, or None to never rotate
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        # Continue in the last segment when appending to an existing log
+        self.segment = len(_segment_paths(path)) - 1 if os.path.exists(path) else 0
+        self._open_segment()
+        if metadata is not None:
+            self._write_line({'metadata': metadata})
+
+    def _open_segment(self) -> None:
+        segment_path = _segment_path(self.path, self.segment)
+        if os.path.exists(segment_path):
+            # Appending straight after a line torn by a crash would corrupt the next record too
+            _drop_torn_line(segment_path)
+        self._file = open(segment_path, 'a', encoding='utf-8')
+        self._bytes = os.path.getsize(segment_path)
+        self._last_flush = time.monotonic()
+
+    def _write_line(self, record: Dict[str, Any], can_rotate: bool = True) -> None:
+        line = json.dumps(record) + '\n'
+        self._file.write(line)
+        self._bytes += len(line.encode('utf-8'))
+        
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        if can_rotate and self.max_bytes is not None and self._bytes >= self.max_bytes:
+            self.rotate()
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        """Append a completed request/response entry."""
+        self._write_line(entry)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """(segment, size in bytes) of everything written so far, for truncate_log."""
+        return self.segment, self._bytes
+
+    def flush(self) -> None:
+        """Flush buffered lines and fsync them to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def rotate(self) -> None:
+        """Close the current segment and continue in the next one."""
+        self.flush()
+        self._file.close()
+        self.segment += 1
+        self._open_segment()
+
+    def close(self, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Write final metadata, such as totals, and close the log."""
+        if metadata is not None:
+            self._write_line({'metadata': metadata}, can_rotate=False)
+        self.flush()
+        self._file.close()
@@ -1,19 +1,87 @@
 import json
 import logging
 import base64
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional, Tuple
 from .permission_model import PermissionModel
 from urllib.parse import urlparse, parse_qs
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class _TrieNode:
+    __slots__ = ('literals', 'param', 'template', 'params')
+
+    def __init__(self):
+        self.literals: Dict[str, '_TrieNode'] = {}
+        self.param: Optional['_TrieNode'] = None
+        self.template: Optional[str] = None
+        self.params: Tuple[Tuple[int, str], ...] = ()
+
+class PathTemplateTrie:
+    """Segment trie that resolves request paths to OpenAPI path templates."""
+
+    def __init__(self, templates: Iterable[str]):
+        self._root = _TrieNode()
+        self._templates = set()
+        for template in templates:
+            self.add(template)
+
+    @staticmethod
+    def _is_param(part: str) -> bool:
+        return part.startswith('{') and part.endswith('}')
+
+    def add(self, template: str) -> None:
+        """Add a template; if several templates have the same shape, the first one added wins."""
+        self._templates.add(template)
+        node = self._root
+        params = []
+        for i, part in enumerate(template.split('/')):
+            if self._is_param(part):
+                params.append((i, part[1:-1]))
+                if node.param is None:
+                    node.param = _TrieNode()
+                node = node.param
+            else:
+                node = node.literals.setdefault(part, _TrieNode())
+                
+        if node.template is None:
+            node.template = template
+            node.params = tuple(params)
+
+    def _search(self, node: _TrieNode, parts: list, i: int) -> Optional[_TrieNode]:
+        if i == len(parts):
+            return node if node.template is not None else None
+            
+        # Literal segments take precedence over {param} segments
+        child = node.literals.get(parts[i])
+        if child is not None:
+            found = self._search(child, parts, i + 1)
+            if found is not None:
+                return found
+                
+        if node.param is not None:
+            return self._search(node.param, parts, i + 1)
+        return None
+
+    def match(self, path: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Resolve a path to its template and the values captured by each {param}."""
+        # A path that is itself a template matches that template directly
+        if path in self._templates:
+            return path, {}
+            
+        parts = path.split('/')
+        node = self._search(self._root, parts, 0)
+        if node is None:
+            return None
+        return node.template, {name: parts[i] for i, name in node.params}
+
 class Oracle:
     def __init__(self, permission_model: PermissionModel):
         """Initialize the Oracle with a permission model."""
         self.permission_model = permission_model
         self.openapi_spec = permission_model.openapi_spec
         self._path_templates = self._extract_path_templates()
+        self._template_trie = PathTemplateTrie(self._path_templates)
 
     def _extract_path_templates(self) -> Dict[str, str]:
         """Extract path templates from OpenAPI spec and map them to their patterns."""
@@ -23,37 +91,15 @@ class Oracle:
             templates[path] = path
         return templates
 
+    def resolve_path(self, request_path: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Resolve a request path to its OpenAPI template and captured path parameters."""
+        parsed = urlparse(request_path)
+        return self._template_trie.match(parsed.path)
+
     def _match_path_to_template(self, request_path: str) -> Optional[str]:
         """Match a request path to its OpenAPI template."""
-        parsed = urlparse(request_path)
-        path = parsed.path
-        
-        # Try direct match first
-        if path in self._path_templates:
-            # print(f"🔹 Direct match: {path} -> {self._path_templates[path]}")
-            return path
-            
-        # Try pattern matching by replacing parameters with actual values
-        path_parts = path.split('/')
-        for template, original_template in self._path_templates.items():
-            template_parts = template.split('/')
-            
-            # Skip if different number of parts
-            if len(path_parts) != len(template_parts):
-                continue
-                
-            # Check if all parts match (either exactly or parameter matches)
-            matches = True
-            for path_part, template_part in zip(path_parts, template_parts):
-                if not (template_part.startswith('{') and template_part.endswith('}')) and path_part != template_part:
-                    matches = False
-                    break
-                    
-            if matches:
-                # print(f"🔹 Pattern match: {path} -> {original_template}")
-                return original_template
-                
-        return None
+        resolved = self.resolve_path(request_path)
+        return resolved[0] if resolved else None
 
     def _extract_object_id(self, template: str, actual_path: str) -> Optional[str]:
         """Extract object ID from the actual path based on the template."""
@@ -0,0 +1,72 @@
+import os
+import hashlib
+import logging
+import pandas as pd
+from typing import Iterable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PermissionMatrixCache:
+    def __init__(self, cache_dir: str):
+        """
+        Initialize a content-addressed cache of generated permission matrices.
+
+        Args:
+            cache_dir: Directory holding one Parquet file per input fingerprint
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def fingerprint(input_paths: Iterable[str], *parts: str) -> str:
+        """Hash the contents of the input files together with extra parts such as model and prompt version."""
+        digest = hashlib.sha256()
+        for path in input_paths:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            # Separate inputs so moving bytes between files changes the hash
+            digest.update(b'\0')
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached matrix for a fingerprint, or None on a miss."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {str(e)}")
+            return None
+
+    def put(self, key: str, permissions_df: pd.DataFrame) -> Optional[str]:
+        """Store a matrix under a fingerprint and return the file path, or None if it could not be written."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.tmp"
+        try:
+            permissions_df.to_parquet(tmp_path, index=False)
+        except Exception as e:
+            logger.warning(f"Could not cache permission matrix: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        return path
+
+    def invalidate(self, key: str) -> bool:
+        """Remove the entry for a fingerprint. Returns True if one existed."""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
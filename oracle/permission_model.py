@@ -1,30 +1,97 @@
+import os
 import json
+import time
+import numpy as np
 import pandas as pd
 from openai import OpenAI
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import base64
 from urllib.parse import urlparse
+from .network_log import NetworkLog
+from .permission_cache import PermissionMatrixCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever the generation prompt changes so cached matrices are not reused
+PROMPT_VERSION = "1"
+
+def _resource_of(path: str) -> str:
+    """Get the resource a path belongs to, e.g. 'test-results' for '/api/test-results/{patientId}'."""
+    parts = [part for part in path.split('/') if part]
+    if parts and parts[0] == 'api':
+        parts = parts[1:]
+    return parts[0] if parts else '/'
+
+def _normalize_resource(name: str) -> str:
+    return name.lower().replace('-', '_')
+
+def _wildcard_object(object_id: str) -> Optional[str]:
+    """Turn an object ID like 'users[3]' into the wildcard 'users[*]' for its type."""
+    if isinstance(object_id, str) and object_id.endswith(']') and '[' in object_id:
+        return object_id[:object_id.index('[')] + '[*]'
+    return None
+
 class PermissionModel:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", cache_dir: Optional[str] = None):
+        """
+        Initialize the permission model.
+        
+        Args:
+            api_key: OpenAI API key
+            model: OpenAI model used to generate the permission matrix
+            cache_dir: Directory for cached permission matrices, or None to disable caching
+        """
         self.client = OpenAI(api_key=api_key)
+        self.model = model
+        self.cache = PermissionMatrixCache(cache_dir) if cache_dir else None
+        self.input_paths: List[str] = []
+        self.user_roles: Dict[str, str] = {}
+        self.failed_chunks: List[Dict[str, Any]] = []
         self.permissions_df = None
 
+    @property
+    def permissions_df(self) -> Optional[pd.DataFrame]:
+        return self._permissions_df
+
+    @permissions_df.setter
+    def permissions_df(self, permissions_df: Optional[pd.DataFrame]) -> None:
+        """Store the permission matrix and rebuild the lookup indexes from it."""
+        self._permissions_df = permissions_df
+        self._permission_index: Dict[Tuple[Any, Any, Any], bool] = {}
+        self._permission_lookup = None
+        if permissions_df is None:
+            return
+            
+        # The first row for a (user, object, method) triple wins, as with the original mask scan
+        unique = permissions_df.drop_duplicates(subset=['user', 'object', 'method'], keep='first')
+        values = [bool(value) for value in unique['value']]
+        self._permission_index = dict(zip(
+            zip(unique['user'], unique['object'], unique['method']),
+            values
+        ))
+        self._permission_lookup = pd.Series(
+            values,
+            index=pd.MultiIndex.from_frame(unique[['user', 'object', 'method']]),
+            dtype=object
+        )
+
     def load_data(self, openapi_path: str, network_log_path: str, objects_path: str) -> None:
         """Load all required data sources."""
         try:
             with open(openapi_path, 'r') as f:
                 self.openapi_spec = json.load(f)
             
-            with open(network_log_path, 'r') as f:
-                self.network_log = json.load(f)
+            # Entries are streamed from disk whenever the log is analysed
+            self.network_log = NetworkLog(network_log_path)
             
             with open(objects_path, 'r') as f:
                 self.objects = json.load(f)
+                
+            self.input_paths = [openapi_path, network_log_path, objects_path]
         except Exception as e:
             logger.error(f"Error loading data: {str(e)}")
             raise
@@ -50,7 +117,8 @@ class PermissionModel:
         """Analyze network traffic to understand access patterns."""
         access_patterns = []
         
-        for entry in self.network_log.get('requests', []):
+        entries = self.network_log.get('requests', []) if isinstance(self.network_log, dict) else self.network_log
+        for entry in entries:
             request = entry.get('request', {})
             response = entry.get('response', {})
             
@@ -65,6 +133,8 @@ class PermissionModel:
                     decoded = base64.b64decode(payload)
                     data = json.loads(decoded)
                     user_id = str(data.get('user_id'))
+                    if data.get('role'):
+                        self.user_roles[user_id] = data['role']
                 except:
                     pass
             
@@ -84,31 +154,51 @@ class PermissionModel:
         
         return access_patterns
 
-    def generate_permission_matrix(self) -> pd.DataFrame:
-        """Generate permission matrix using OpenAI."""
-        crud_operations = self._extract_crud_operations()
-        access_patterns = self._analyze_network_traffic()
+    def cache_key(self, chunked: bool = False) -> Optional[str]:
+        """
+        Fingerprint of the loaded inputs, model, prompt version and generation mode.
         
-        # Prepare context for OpenAI
-        context = {
-            'operations': crud_operations,
-            'access_patterns': access_patterns,
-            'objects': self.objects
-        }
-        
-        prompt = f"""Based on the following application context, generate a permission matrix.
+        Returns None if no input files were loaded, since inputs set directly on the
+        model cannot be fingerprinted and their matrix must not be cached.
+        """
+        if not self.input_paths:
+            return None
+        parts = [self.model, PROMPT_VERSION]
+        if chunked:
+            parts.append('chunked')
+        return PermissionMatrixCache.fingerprint(self.input_paths, *parts)
+
+    def invalidate_cache(self) -> bool:
+        """Drop the cached matrices for the loaded inputs. Returns True if any existed."""
+        if self.cache is None or not self.input_paths:
+            return False
+        removed = [self.cache.invalidate(self.cache_key(chunked)) for chunked in (False, True)]
+        return any(removed)
+
+    def _build_prompt(
+        self,
+        operations: List[Dict[str, Any]],
+        access_patterns: List[Dict[str, Any]],
+        objects: Any,
+        user: Optional[str] = None,
+        indent: Optional[int] = 2
+    ) -> str:
+        """Build the permission matrix prompt, optionally restricted to a single user."""
+        scope = f"\nOnly generate permission objects for user \"{user}\"." if user is not None else ""
+        separators = None if indent else (',', ':')
+        return f"""Based on the following application context, generate a permission matrix.
 You must respond with ONLY a JSON array of permission objects, with no additional text.
-Each permission object must have these exact fields: "user", "object", "method", "value"
+Each permission object must have these exact fields: "user", "object", "method", "value"{scope}
 
 Context:
 OpenAPI Operations:
-{json.dumps(crud_operations, indent=2)}
+{json.dumps(operations, indent=indent, separators=separators)}
 
 Access Patterns:
-{json.dumps(access_patterns, indent=2)}
+{json.dumps(access_patterns, indent=indent, separators=separators)}
 
 Objects:
-{json.dumps(self.objects, indent=2)}
+{json.dumps(objects, indent=indent, separators=separators)}
 
 Example response format:
 [
@@ -116,25 +206,165 @@ Example response format:
     {{"user": "alice", "object": "user[1]", "method": "PUT", "value": false}}
 ]"""
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a security expert helping to generate a permission matrix."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0
-            )
+    def _request_permissions(self, prompt: str) -> List[Dict[str, Any]]:
+        """Send a prompt to OpenAI and parse the returned permission objects."""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a security expert helping to generate a permission matrix."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0
+        )
+        return json.loads(response.choices[0].message.content)
+
+    def _load_cached_matrix(self, key: Optional[str]) -> Optional[pd.DataFrame]:
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"Loaded cached permission matrix {key[:12]}")
+            # Still learn user roles from the traffic for role-level lookups
+            self._analyze_network_traffic()
+            self.permissions_df = cached
+        return cached
+
+    def generate_permission_matrix(
+        self,
+        refresh: bool = False,
+        chunked: bool = False,
+        max_workers: int = 4,
+        max_retries: int = 2
+    ) -> pd.DataFrame:
+        """
+        Generate permission matrix using OpenAI.
+        
+        If a cache directory is configured, a matrix generated earlier from identical
+        inputs is returned without calling the API unless refresh is True.
+        
+        Args:
+            refresh: Regenerate even if a cached matrix exists
+            chunked: Split generation into one prompt per (resource, user), see _generate_chunked
+            max_workers: Number of chunks requested concurrently in chunked mode
+            max_retries: Number of times a failed chunk is retried in chunked mode
+        """
+        key = self.cache_key(chunked) if self.cache is not None else None
+        if self.cache is not None and key is None:
+            logger.warning("Permission matrix caching skipped: no input files were loaded")
+        if not refresh and self._load_cached_matrix(key) is not None:
+            return self.permissions_df
+            
+        if chunked:
+            self.permissions_df, failed = self._generate_chunked(max_workers, max_retries)
+            # Leave failed runs uncached so the next run asks for the missing chunks again
+            if key is not None and not failed:
+                self.cache.put(key, self.permissions_df)
+            return self.permissions_df
             
+        crud_operations = self._extract_crud_operations()
+        access_patterns = self._analyze_network_traffic()
+        prompt = self._build_prompt(crud_operations, access_patterns, self.objects)
+
+        try:
             # Parse the response and convert to DataFrame
-            permissions = json.loads(response.choices[0].message.content)
+            permissions = self._request_permissions(prompt)
             self.permissions_df = pd.DataFrame(permissions)
+            
+            if key is not None:
+                self.cache.put(key, self.permissions_df)
             return self.permissions_df
             
         except Exception as e:
             logger.error(f"Error generating permission matrix: {str(e)}")
             raise
 
+    def _partition(self) -> List[Dict[str, Any]]:
+        """Split operations, access patterns and objects into one chunk per (resource, user)."""
+        operations_by_resource = defaultdict(list)
+        for operation in self._extract_crud_operations():
+            operations_by_resource[_resource_of(operation['path'])].append(operation)
+            
+        patterns_by_chunk = defaultdict(list)
+        users = []
+        for pattern in self._analyze_network_traffic():
+            if pattern['user'] not in users:
+                users.append(pattern['user'])
+            patterns_by_chunk[(_resource_of(pattern['path']), pattern['user'])].append(pattern)
+            
+        chunks = []
+        for resource, operations in operations_by_resource.items():
+            # Only send the object types this resource works on, or just the type names if none match
+            objects = {
+                object_type: values for object_type, values in self.objects.items()
+                if _normalize_resource(object_type) == _normalize_resource(resource)
+            } if isinstance(self.objects, dict) else self.objects
+            if not objects and isinstance(self.objects, dict):
+                objects = list(self.objects.keys())
+                
+            for user in users or [None]:
+                chunks.append({
+                    'resource': resource,
+                    'user': user,
+                    'operations': operations,
+                    'access_patterns': patterns_by_chunk.get((resource, user), []),
+                    'objects': objects
+                })
+        return chunks
+
+    def _generate_chunk(self, chunk: Dict[str, Any], max_retries: int) -> List[Dict[str, Any]]:
+        """Generate the permissions for one chunk, retrying with backoff on failure."""
+        prompt = self._build_prompt(
+            chunk['operations'], chunk['access_patterns'], chunk['objects'], user=chunk['user'], indent=None
+        )
+        for attempt in range(max_retries + 1):
+            try:
+                permissions = self._request_permissions(prompt)
+                if not isinstance(permissions, list) or not all(
+                    isinstance(p, dict) and {'user', 'object', 'method', 'value'} <= p.keys()
+                    for p in permissions
+                ):
+                    raise ValueError("Response is not a list of permission objects")
+                return permissions
+            except Exception as e:
+                logger.warning(
+                    f"Chunk {chunk['resource']}/{chunk['user']} failed (attempt {attempt + 1}): {str(e)}"
+                )
+                if attempt == max_retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def _generate_chunked(self, max_workers: int, max_retries: int) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+        """
+        Generate the permission matrix chunk by chunk with a bounded worker pool.
+        
+        Returns the merged, deduplicated matrix and the chunks that failed after all retries.
+        """
+        chunks = self._partition()
+        logger.info(f"Generating permission matrix in {len(chunks)} chunks")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._generate_chunk, chunk, max_retries) for chunk in chunks]
+            
+        # Merge in chunk order so the result does not depend on completion order
+        permissions = []
+        failed = []
+        for chunk, future in zip(chunks, futures):
+            try:
+                permissions.extend(future.result())
+            except Exception as e:
+                logger.error(f"Giving up on chunk {chunk['resource']}/{chunk['user']}: {str(e)}")
+                failed.append(chunk)
+                
+        if chunks and len(failed) == len(chunks):
+            raise RuntimeError("Every permission matrix chunk failed")
+            
+        permissions_df = pd.DataFrame(permissions, columns=['user', 'object', 'method', 'value'])
+        permissions_df = permissions_df.drop_duplicates(
+            subset=['user', 'object', 'method'], keep='first'
+        ).reset_index(drop=True)
+        self.failed_chunks = failed
+        return permissions_df, failed
+
     def save_permission_matrix(self, output_path: str) -> None:
         """Save the permission matrix to a CSV file."""
         if self.permissions_df is not None:
@@ -143,23 +373,84 @@ Example response format:
         else:
             raise ValueError("Permission matrix has not been generated yet")
 
-    def check_permission(self, user: str, object_id: str, method: str) -> bool:
-        """Check if a user has permission to perform an operation on an object."""
+    def load_permission_matrix(self, input_path: str) -> pd.DataFrame:
+        """Load a permission matrix written by save_permission_matrix, or a cached Parquet file."""
+        if os.path.splitext(input_path)[1] == '.parquet':
+            self.permissions_df = pd.read_parquet(input_path)
+        else:
+            self.permissions_df = pd.read_csv(input_path, dtype={'user': str, 'object': str, 'method': str})
+        logger.info(f"Permission matrix loaded from {input_path}")
+        return self.permissions_df
+
+    def _permission_keys(self, user: str, object_id: str, method: str, role: Optional[str]):
+        """Yield lookup keys from most to least specific: user, then role, each with object fallbacks."""
+        wildcard = _wildcard_object(object_id)
+        for principal in (user, role):
+            if principal is None:
+                continue
+            yield (principal, object_id, method)
+            if wildcard is not None:
+                yield (principal, wildcard, method)
+            yield (principal, '*', method)
+
+    def check_permission(self, user: str, object_id: str, method: str, role: Optional[str] = None) -> bool:
+        """
+        Check if a user has permission to perform an operation on an object.
+        
+        Rows for the user are checked before rows for their role, and an exact object
+        before its type wildcard ('users[*]') and the global wildcard ('*').
+        The role defaults to the one seen for the user in the network log.
+        """
         if self.permissions_df is None:
             raise ValueError("Permission matrix has not been generated yet")
             
-        mask = (
-            (self.permissions_df['user'] == user) &
-            (self.permissions_df['object'] == object_id) &
-            (self.permissions_df['method'] == method)
-        )
-        
-        matching_permissions = self.permissions_df[mask]
+        if role is None:
+            role = self.user_roles.get(user)
+            
+        for key in self._permission_keys(user, object_id, method, role):
+            value = self._permission_index.get(key)
+            if value is not None:
+                return value
+                
+        return False
+
+    def check_permissions_bulk(self, frame: pd.DataFrame) -> pd.Series:
+        """
+        Check a batch of permissions in one call.
         
-        if matching_permissions.empty:
-            return False
+        Args:
+            frame: DataFrame with 'user', 'object' and 'method' columns, and optionally 'role'
             
-        return matching_permissions.iloc[0]['value']
+        Returns:
+            pd.Series of booleans aligned with the frame's index
+        """
+        if self.permissions_df is None:
+            raise ValueError("Permission matrix has not been generated yet")
+            
+        users = frame['user'].to_numpy(dtype=object)
+        objects = frame['object'].to_numpy(dtype=object)
+        methods = frame['method'].to_numpy(dtype=object)
+        if 'role' in frame:
+            roles = frame['role'].to_numpy(dtype=object)
+        else:
+            roles = frame['user'].map(self.user_roles).to_numpy(dtype=object)
+        wildcards = frame['object'].map(_wildcard_object).to_numpy(dtype=object)
+        everything = np.full(len(frame), '*', dtype=object)
+        
+        # Resolve each fallback level in one vectorized lookup, keeping earlier answers
+        result = np.full(len(frame), None, dtype=object)
+        for principals in (users, roles):
+            for targets in (objects, wildcards, everything):
+                keys = pd.MultiIndex.from_arrays([principals, targets, methods])
+                values = self._permission_lookup.reindex(keys).to_numpy(dtype=object)
+                missing = pd.isna(result)
+                result[missing] = values[missing]
+                
+        return pd.Series(
+            [bool(value) if not pd.isna(value) else False for value in result],
+            index=frame.index,
+            dtype=bool
+        )
 
 def main():
     # Initialize the permission model
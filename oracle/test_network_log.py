@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path so the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from oracle.body_store import BodyStore
+from oracle.network_log import (
+    NetworkLog, NetworkLogWriter, iter_log_entries, load_network_log, read_log_metadata, truncate_log
+)
+
+class TestNetworkLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.entries = [
+            {
+                "id": i,
+                "timestamp": "2025-02-16T05:42:50",
+                "request": {"url": f"http://localhost:3000/api/users/{i}", "method": "GET", "headers": {}},
+                "response": {"status": 200, "body": "{\n  \"id\": %d, \"text\": \"]}\"\n}" % i, "size": 1.5e3}
+            }
+            for i in range(50)
+        ]
+        self.metadata = {"start_url": "http://localhost:3000/", "total_requests": 50}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_streams_crawler_json(self):
+        """Test that entries are streamed from the crawler's JSON format"""
+        path = self._write('log.json', json.dumps({"metadata": self.metadata, "requests": self.entries}, indent=2))
+        self.assertEqual(list(iter_log_entries(path)), self.entries)
+        self.assertEqual(read_log_metadata(path), self.metadata)
+
+    def test_metadata_after_requests(self):
+        """Test that metadata stored after the entries is still found"""
+        path = self._write('log.json', json.dumps({"requests": self.entries, "metadata": self.metadata}))
+        self.assertEqual(read_log_metadata(path), self.metadata)
+        self.assertEqual(len(list(NetworkLog(path))), 50)
+
+    def test_streams_ndjson(self):
+        """Test that NDJSON logs with a metadata header line are supported"""
+        lines = [json.dumps({"metadata": self.metadata})] + [json.dumps(entry) for entry in self.entries]
+        path = self._write('log.ndjson', "\n".join(lines) + "\n")
+        log = NetworkLog(path)
+        self.assertEqual(list(log), self.entries)
+        self.assertEqual(list(log), self.entries)
+        self.assertEqual(log.metadata, self.metadata)
+
+    def test_writer_rotates_and_reconstructs(self):
+        """Test that rotated NDJSON segments load back into the crawler's log shape"""
+        path = os.path.join(self.tmp_dir, 'log.ndjson')
+        writer = NetworkLogWriter(path, metadata={"start_url": "http://localhost:3000/"}, max_bytes=2000)
+        for entry in self.entries:
+            writer.write(entry)
+        writer.close(metadata={"total_requests": 50})
+        
+        self.assertGreater(writer.segment, 1)
+        self.assertEqual(load_network_log(path), {
+            "metadata": {"start_url": "http://localhost:3000/", "total_requests": 50},
+            "requests": self.entries
+        })
+
+    def test_writer_appends_to_last_segment(self):
+        """Test that reopening a log continues after its existing entries"""
+        path = os.path.join(self.tmp_dir, 'log.ndjson')
+        writer = NetworkLogWriter(path, max_bytes=2000)
+        for entry in self.entries[:25]:
+            writer.write(entry)
+        writer.close()
+        
+        writer = NetworkLogWriter(path, max_bytes=2000)
+        for entry in self.entries[25:]:
+            writer.write(entry)
+        writer.close()
+        self.assertEqual(list(iter_log_entries(path)), self.entries)
+
+    def test_torn_last_line(self):
+        """Test that a line torn by a crash is skipped when reading and dropped when appending"""
+        path = os.path.join(self.tmp_dir, 'log.ndjson')
+        writer = NetworkLogWriter(path, metadata=self.metadata)
+        for entry in self.entries[:25]:
+            writer.write(entry)
+        writer.close()
+        with open(path, 'a') as f:
+            f.write('{"id": 25, "requ')
+        
+        self.assertEqual(list(iter_log_entries(path)), self.entries[:25])
+        self.assertEqual(read_log_metadata(path), self.metadata)
+        
+        writer = NetworkLogWriter(path)
+        for entry in self.entries[25:]:
+            writer.write(entry)
+        writer.close()
+        self.assertEqual(list(iter_log_entries(path)), self.entries)
+
+    def test_malformed_line_inside_log_raises(self):
+        """Test that only the last line may be torn, and corruption elsewhere is still reported"""
+        lines = [json.dumps(self.entries[0]), '{"id": 1, "requ', json.dumps(self.entries[2])]
+        path = self._write('log.ndjson', "\n".join(lines) + "\n")
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_log_entries(path))
+
+    def test_truncate_to_position(self):
+        """Test that a log cut back to a writer position only keeps what was written before it"""
+        path = os.path.join(self.tmp_dir, 'log.ndjson')
+        writer = NetworkLogWriter(path, max_bytes=2000)
+        for entry in self.entries[:20]:
+            writer.write(entry)
+        writer.flush()
+        position = writer.position
+        for entry in self.entries[20:]:
+            writer.write(entry)
+        writer.close()
+        
+        truncate_log(path, *position)
+        writer = NetworkLogWriter(path, max_bytes=2000)
+        for entry in self.entries[20:30]:
+            writer.write(entry)
+        writer.close()
+        self.assertEqual(list(iter_log_entries(path)), self.entries[:30])
+
+    def test_resolves_body_store_references(self):
+        """Test that bodies moved to a body store are deduplicated, truncated and read back transparently"""
+        store = BodyStore(os.path.join(self.tmp_dir, 'bodies'), max_body_bytes=20)
+        path = os.path.join(self.tmp_dir, 'log.ndjson')
+        writer = NetworkLogWriter(path, metadata={"body_store": "bodies"})
+        for entry in self.entries[:3]:
+            writer.write(dict(
+                entry,
+                request=dict(entry["request"], post_data=store.put('{"a": 1}', "application/json")),
+                response=dict(entry["response"], body=store.put('[{"id": 1}, {"id": 2}, {"id": 3}]'))
+            ))
+        writer.close()
+        
+        raw = list(iter_log_entries(path, resolve_bodies=False))
+        self.assertEqual(raw[0]["response"]["body"], raw[2]["response"]["body"])
+        self.assertTrue(raw[0]["response"]["body"]["truncated"])
+        self.assertEqual(raw[0]["response"]["body"]["size"], 33)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(store.root)), 2)
+        
+        entry = next(iter_log_entries(path))
+        self.assertEqual(entry["request"]["post_data"], {"a": 1})
+        self.assertEqual(entry["response"]["body"], '[{"id": 1}, {"id": 2')
+
+if __name__ == '__main__':
+    unittest.main()
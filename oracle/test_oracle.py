@@ -1,7 +1,15 @@
+import os
+import sys
 import unittest
 import json
-from oracle import Oracle
-from permission_model import PermissionModel
+
+# Add parent directory to path so the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from oracle.oracle import Oracle, PathTemplateTrie
+from oracle.permission_model import PermissionModel
 
 class TestOracle(unittest.TestCase):
     @classmethod
@@ -186,5 +194,44 @@ class TestOracle(unittest.TestCase):
             if os.path.exists(file):
                 os.remove(file)
 
+class TestPathTemplateTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = PathTemplateTrie([
+            "/api/users/{id}",
+            "/api/users/{user_id}",
+            "/api/users/me",
+            "/api/patients/{patient_id}/records/{record_id}",
+            "/api/{resource}/{id}/records/latest"
+        ])
+
+    def test_captures_parameters(self):
+        """Test that a path resolves to its template and captured parameters"""
+        self.assertEqual(
+            self.trie.match("/api/patients/4/records/9"),
+            ("/api/patients/{patient_id}/records/{record_id}", {"patient_id": "4", "record_id": "9"})
+        )
+
+    def test_literal_precedence(self):
+        """Test that literal segments win over parameter segments"""
+        self.assertEqual(self.trie.match("/api/users/me"), ("/api/users/me", {}))
+        self.assertEqual(self.trie.match("/api/patients/4/records/latest")[0],
+                         "/api/patients/{patient_id}/records/{record_id}")
+
+    def test_backtracks_to_parameter_branch(self):
+        """Test that a failed literal branch falls back to a parameter branch"""
+        self.assertEqual(
+            self.trie.match("/api/users/1/records/latest"),
+            ("/api/{resource}/{id}/records/latest", {"resource": "users", "id": "1"})
+        )
+
+    def test_first_template_wins(self):
+        """Test that the first of several same-shaped templates is used"""
+        self.assertEqual(self.trie.match("/api/users/5"), ("/api/users/{id}", {"id": "5"}))
+
+    def test_no_match(self):
+        """Test that unknown paths and segment counts do not match"""
+        self.assertIsNone(self.trie.match("/api/users"))
+        self.assertIsNone(self.trie.match("/other/users/1"))
+
 if __name__ == '__main__':
     unittest.main()
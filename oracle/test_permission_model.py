@@ -1,7 +1,19 @@
 import unittest
 import json
 import os
-from permission_model import PermissionModel
+import sys
+import base64
+import shutil
+import tempfile
+import pandas as pd
+from unittest import mock
+
+# Add parent directory to path so the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from oracle.permission_model import PermissionModel
 
 class TestPermissionModel(unittest.TestCase):
     @classmethod
@@ -141,5 +153,194 @@ class TestPermissionModel(unittest.TestCase):
             if os.path.exists(file):
                 os.remove(file)
 
+def _make_token(payload):
+    """Build an unsigned JWT carrying the given payload."""
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+    return f"e30.{encoded}.sig"
+
+TOKEN_USER_1 = _make_token({"user_id": 1, "role": "patient"})
+TOKEN_USER_2 = _make_token({"user_id": 2, "role": "doctor"})
+
+class TestPermissionIndex(unittest.TestCase):
+    def setUp(self):
+        self.model = PermissionModel(api_key="test-key")
+        self.model.user_roles = {"3": "patient", "5": "doctor"}
+        self.model.permissions_df = pd.DataFrame([
+            {"user": "3", "object": "users[3]", "method": "GET", "value": True},
+            {"user": "3", "object": "users[3]", "method": "GET", "value": False},
+            {"user": "3", "object": "users[4]", "method": "GET", "value": False},
+            {"user": "patient", "object": "users[*]", "method": "GET", "value": True},
+            {"user": "doctor", "object": "*", "method": "PUT", "value": True}
+        ])
+
+    def test_exact_lookup_first_row_wins(self):
+        """Test that exact entries are used and duplicates keep the first row"""
+        self.assertTrue(self.model.check_permission("3", "users[3]", "GET"))
+        self.assertFalse(self.model.check_permission("3", "users[4]", "GET"))
+
+    def test_role_and_wildcard_fallbacks(self):
+        """Test that role rows and wildcard objects are used when no user row exists"""
+        self.assertTrue(self.model.check_permission("3", "users[9]", "GET"))
+        self.assertTrue(self.model.check_permission("5", "test-results[1]", "PUT"))
+        self.assertTrue(self.model.check_permission("7", "users[1]", "GET", role="patient"))
+        self.assertFalse(self.model.check_permission("5", "users[1]", "GET"))
+        self.assertFalse(self.model.check_permission("7", "users[1]", "GET"))
+
+    def test_index_rebuilt_on_assignment(self):
+        """Test that replacing the matrix rebuilds the index"""
+        self.model.permissions_df = pd.DataFrame([
+            {"user": "3", "object": "users[4]", "method": "GET", "value": True}
+        ])
+        self.assertTrue(self.model.check_permission("3", "users[4]", "GET"))
+        self.assertFalse(self.model.check_permission("3", "users[3]", "GET"))
+
+    def test_bulk_matches_single_checks(self):
+        """Test that bulk checks agree with individual checks"""
+        frame = pd.DataFrame({
+            "user": ["3", "3", "3", "5", "5", "7"],
+            "object": ["users[3]", "users[4]", "users[9]", "test-results[1]", "users[1]", "users[1]"],
+            "method": ["GET", "GET", "GET", "PUT", "GET", "GET"]
+        }, index=[10, 11, 12, 13, 14, 15])
+        result = self.model.check_permissions_bulk(frame)
+        
+        self.assertEqual(list(result.index), list(frame.index))
+        self.assertEqual(list(result), [
+            self.model.check_permission(row.user, row.object, row.method)
+            for row in frame.itertuples()
+        ])
+
+class TestPermissionMatrixCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = {}
+        for name, data in [
+            ('openapi', {"paths": {"/users/{id}": {"get": {"operationId": "getUser"}}}}),
+            ('network_log', {"metadata": {}, "requests": []}),
+            ('objects', {"users": [{"id": "1", "type": "user"}]})
+        ]:
+            self.paths[name] = os.path.join(self.tmp_dir, f"{name}.json")
+            with open(self.paths[name], 'w') as f:
+                json.dump(data, f)
+                
+        self.model = PermissionModel(api_key="test-key", cache_dir=os.path.join(self.tmp_dir, 'cache'))
+        self.model.load_data(
+            openapi_path=self.paths['openapi'],
+            network_log_path=self.paths['network_log'],
+            objects_path=self.paths['objects']
+        )
+        
+        completion = mock.MagicMock()
+        completion.choices[0].message.content = json.dumps([
+            {"user": "1", "object": "users[1]", "method": "GET", "value": True}
+        ])
+        self.create = mock.Mock(return_value=completion)
+        self.model.client = mock.Mock()
+        self.model.client.chat.completions.create = self.create
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache_hit_skips_api(self):
+        """Test that identical inputs reuse the cached matrix"""
+        self.model.generate_permission_matrix()
+        self.model.permissions_df = None
+        matrix = self.model.generate_permission_matrix()
+        
+        self.assertEqual(self.create.call_count, 1)
+        self.assertTrue(self.model.check_permission("1", "users[1]", "GET"))
+        self.assertEqual(len(matrix), 1)
+
+    def test_changed_inputs_and_refresh_miss(self):
+        """Test that changed inputs, refresh and invalidation regenerate the matrix"""
+        self.model.generate_permission_matrix()
+        self.model.generate_permission_matrix(refresh=True)
+        self.assertEqual(self.create.call_count, 2)
+        
+        self.assertTrue(self.model.invalidate_cache())
+        self.model.generate_permission_matrix()
+        self.assertEqual(self.create.call_count, 3)
+        
+        with open(self.paths['objects'], 'w') as f:
+            json.dump({"users": []}, f)
+        self.model.generate_permission_matrix()
+        self.assertEqual(self.create.call_count, 4)
+
+    def test_inputs_not_loaded_from_files_are_not_cached(self):
+        """Test that a model whose inputs were set directly never shares another model's cache"""
+        self.model.generate_permission_matrix()
+        
+        model = PermissionModel(api_key="test-key", cache_dir=os.path.join(self.tmp_dir, 'cache'))
+        model.openapi_spec = {"paths": {"/orders/{id}": {"get": {"operationId": "getOrder"}}}}
+        model.network_log = {"metadata": {}, "requests": []}
+        model.objects = {"orders": [{"id": "9", "type": "order"}]}
+        model.client = self.model.client
+        model.generate_permission_matrix()
+        model.generate_permission_matrix()
+        
+        self.assertEqual(self.create.call_count, 3)
+        self.assertFalse(model.invalidate_cache())
+        self.assertTrue(self.model.invalidate_cache())
+
+    def test_load_saved_matrix(self):
+        """Test that a matrix saved as CSV can be loaded back"""
+        self.model.generate_permission_matrix()
+        output_path = os.path.join(self.tmp_dir, 'matrix.csv')
+        self.model.save_permission_matrix(output_path)
+        
+        model = PermissionModel(api_key="test-key")
+        model.load_permission_matrix(output_path)
+        self.assertTrue(model.check_permission("1", "users[1]", "GET"))
+
+class TestChunkedGeneration(unittest.TestCase):
+    def setUp(self):
+        self.model = PermissionModel(api_key="test-key")
+        self.model.openapi_spec = {
+            "paths": {
+                "/api/users/{id}": {"get": {"operationId": "getUser"}},
+                "/api/test-results/{id}": {"get": {"operationId": "getResult"}}
+            }
+        }
+        self.model.objects = {"users": {"1": {"id": 1}}, "test_results": {"1": {"id": 1}}}
+        self.model.network_log = {"requests": [
+            {"request": {"url": f"http://localhost/api/{resource}/1", "method": "GET",
+                         "headers": {"authorization": f"Bearer {token}"}},
+             "response": {"status": 200}}
+            for resource in ("users", "test-results") for token in (TOKEN_USER_1, TOKEN_USER_2)
+        ]}
+        self.prompts = []
+        self.failures = 1
+        
+        def request_permissions(prompt):
+            self.prompts.append(prompt)
+            if "test_results" in prompt and self.failures:
+                self.failures -= 1
+                raise ValueError("rate limited")
+            user = "1" if 'user "1"' in prompt else "2"
+            resource = "users" if '"users"' in prompt else "test-results"
+            return [
+                {"user": user, "object": f"{resource}[1]", "method": "GET", "value": True},
+                {"user": user, "object": f"{resource}[1]", "method": "GET", "value": False}
+            ]
+        self.model._request_permissions = request_permissions
+
+    @mock.patch('oracle.permission_model.time.sleep')
+    def test_chunks_merged_and_retried(self, sleep):
+        """Test that chunks are generated per resource and user, retried and deduplicated"""
+        matrix = self.model.generate_permission_matrix(chunked=True, max_workers=2)
+        
+        self.assertEqual(len(self.prompts), 5)
+        self.assertEqual(self.model.failed_chunks, [])
+        self.assertEqual(len(matrix), 4)
+        self.assertTrue(self.model.check_permission("2", "test-results[1]", "GET"))
+
+    @mock.patch('oracle.permission_model.time.sleep')
+    def test_failed_chunk_does_not_abort(self, sleep):
+        """Test that a chunk failing every retry leaves the other chunks in the matrix"""
+        self.failures = 3
+        matrix = self.model.generate_permission_matrix(chunked=True, max_retries=1)
+        
+        self.assertEqual(len(self.model.failed_chunks), 1)
+        self.assertEqual(len(matrix), 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,293 @@
+import os
+import re
+import sys
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+# Add parent directory to path so the oracle and fuzzer packages can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from oracle.network_log import iter_log_entries
+from fuzzer.transport import HTTPTransport, Transport
+
+# Tokens are matched as JWTs wherever they appear: headers, cookies and bodies
+_JWT = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*')
+
+# Request headers that describe the recorded request rather than the replayed one
+_DROPPED_HEADERS = {'content-length', 'host'}
+
+_USERNAME_FIELDS = ('username', 'user', 'email', 'login')
+_PASSWORD_FIELDS = ('password', 'pass')
+
+# Path segments that are ids rather than names: numbers, UUIDs and long hex strings
+_ID_VALUE = re.compile(r'^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{24,})$', re.I)
+
+# Body keys that wrap the objects of the enclosing resource rather than name another one
+_WRAPPER_KEYS = {'data', 'items', 'results', 'records'}
+
+# Ids the replay has learned, keyed by (resource kind, recorded id)
+IdMap = Dict[Tuple[str, str], str]
+
+def _is_id_key(key: str) -> bool:
+    return key == 'id' or key.endswith('Id') or key.endswith('_id')
+
+def _id_kind(name: str) -> str:
+    """
+    Resource kind an id field, path parameter or collection name refers to:
+    'patientId', 'patient_id' and 'patients' are all 'patient'.
+    """
+    name = re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name).lower().replace('-', '_')
+    if name.endswith('_id'):
+        name = name[:-3]
+    if name.endswith('ies'):
+        return name[:-3] + 'y'
+    if name.endswith('s') and not name.endswith('ss'):
+        return name[:-1]
+    return name
+
+def _parse_body(body: Any) -> Any:
+    """Parse a logged body, which the crawler stores as (pretty-printed) JSON text."""
+    if isinstance(body, str):
+        try:
+            return json.loads(body)
+        except ValueError:
+            return body
+    return body
+
+def _find_tokens(response: Dict) -> List[str]:
+    """JWTs in a response's body and headers, in order of appearance and without repeats."""
+    text = json.dumps(response.get('body')) + json.dumps(response.get('headers', {}))
+    return list(dict.fromkeys(_JWT.findall(text)))
+
+class ApiReplayer:
+    def __init__(
+        self,
+        recorded_log: str,
+        source_user: Optional[str] = None,
+        transport: Optional[Transport] = None,
+        path_templates=None,
+        id_aliases: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize a browserless replay of a recorded crawl.
+
+        Args:
+            recorded_log: Network log written by the crawler, in any format iter_log_entries reads
+            source_user: Only replay the entries recorded for this user, or None to replay them all
+            transport: Transport used to send requests, defaults to a pooled HTTPTransport
+            path_templates: PathTemplateTrie of the app's OpenAPI paths. Ids in URLs are then
+                told apart by their path parameter names instead of the segment before them
+            id_aliases: Resource kinds that share ids with another kind, e.g.
+                {'patient': 'user'} when patients are users
+        """
+        self.recorded_log = recorded_log
+        self.source_user = source_user
+        self.transport = transport or HTTPTransport()
+        self.path_templates = path_templates
+        self.id_aliases = id_aliases or {}
+
+    def is_login(self, request: Dict) -> bool:
+        return request['method'] == 'POST' and '/login' in urlsplit(request['url']).path
+
+    def recorded_entries(self) -> Iterator[Dict]:
+        """Completed entries of the recording, in the order they were made."""
+        for entry in iter_log_entries(self.recorded_log):
+            if 'response' not in entry:
+                continue
+            if self.source_user is not None and entry.get('user') != self.source_user:
+                continue
+            yield entry
+
+    def login_body(self, recorded: Any, credentials: Dict[str, str]) -> Dict:
+        """The recorded login body with the username and password of another user."""
+        body = dict(recorded) if isinstance(recorded, dict) else {}
+        username_field = next((k for k in _USERNAME_FIELDS if k in body), 'username')
+        password_field = next((k for k in _PASSWORD_FIELDS if k in body), 'password')
+        body[username_field] = credentials['username']
+        body[password_field] = credentials['password']
+        return body
+
+    def kind(self, name: str) -> str:
+        """Resource kind of an id field, path parameter or collection name, after id_aliases."""
+        kind = _id_kind(name)
+        return self.id_aliases.get(kind, kind)
+
+    def _child_kind(self, key: str, kind: Optional[str]) -> Optional[str]:
+        """Kind of the objects under a body key; wrappers such as 'data' keep the enclosing kind."""
+        return kind if key in _WRAPPER_KEYS else self.kind(key)
+
+    def path_ids(self, path: str) -> List[Tuple[int, str]]:
+        """(segment index, resource kind) of every id in a URL path."""
+        parts = path.split('/')
+        if self.path_templates is not None:
+            match = self.path_templates.match(path)
+            if match is not None:
+                template_parts = match[0].split('/')
+                return [
+                    (i, self.kind(part[1:-1])) for i, part in enumerate(template_parts)
+                    if part.startswith('{') and part.endswith('}')
+                ]
+        # Without a template, an id belongs to the collection named by the segment before it
+        return [
+            (i, self.kind(parts[i - 1])) for i in range(1, len(parts))
+            if _ID_VALUE.match(parts[i]) and parts[i - 1] and not _ID_VALUE.match(parts[i - 1])
+        ]
+
+    def resource_kind(self, request: Dict) -> Optional[str]:
+        """Kind of the objects a request reads or writes, which their bare 'id' fields refer to."""
+        if self.is_login(request):
+            return self.kind('user')
+        path = urlsplit(request['url']).path
+        if self.path_templates is not None:
+            match = self.path_templates.match(path)
+            if match is not None:
+                path = match[0]
+        names = [part for part in path.split('/')
+                 if part and not _ID_VALUE.match(part) and not part.startswith('{')]
+        return self.kind(names[-1]) if names else None
+
+    def learn_ids(self, recorded: Any, replayed: Any, ids: IdMap, kind: Optional[str] = None) -> None:
+        """
+        Walk a recorded and a replayed response body side by side and map every id
+        field of the recording to the value the replaying user got in its place.
+
+        Ids are keyed by their resource kind as well as their value, so that ids of
+        different resources that happen to be equal are never confused. A bare 'id'
+        field is of the given kind, the kind of the objects the body holds.
+        """
+        if isinstance(recorded, dict) and isinstance(replayed, dict):
+            for key, value in recorded.items():
+                if key not in replayed:
+                    continue
+                if _is_id_key(key) and not isinstance(value, (dict, list)):
+                    id_kind = kind if key == 'id' else self.kind(key)
+                    if id_kind and value is not None and replayed[key] is not None and str(value) != str(replayed[key]):
+                        ids.setdefault((id_kind, str(value)), str(replayed[key]))
+                else:
+                    self.learn_ids(value, replayed[key], ids, self._child_kind(key, kind))
+        elif isinstance(recorded, list) and isinstance(replayed, list):
+            for recorded_item, replayed_item in zip(recorded, replayed):
+                self.learn_ids(recorded_item, replayed_item, ids, kind)
+
+    def substitute_url(self, url: str, ids: IdMap) -> str:
+        """Replace the ids in a URL's path, each only with an id learned for its own resource kind."""
+        parts = urlsplit(url)
+        segments = parts.path.split('/')
+        for index, kind in self.path_ids(parts.path):
+            segments[index] = ids.get((kind, segments[index]), segments[index])
+        return urlunsplit(parts._replace(path='/'.join(segments)))
+
+    def substitute_body(self, body: Any, ids: IdMap, kind: Optional[str] = None, key: str = '') -> Any:
+        """Replace id fields in a request body; a bare 'id' is of the given kind."""
+        if isinstance(body, dict):
+            return {
+                k: self.substitute_body(v, ids, kind if _is_id_key(k) else self._child_kind(k, kind), k)
+                for k, v in body.items()
+            }
+        if isinstance(body, list):
+            return [self.substitute_body(item, ids, kind, key) for item in body]
+        if _is_id_key(key):
+            id_kind = kind if key == 'id' else self.kind(key)
+            new = ids.get((id_kind, str(body)))
+            if new is not None:
+                # Keep numeric ids numeric
+                return int(new) if isinstance(body, int) and new.isdigit() else new
+        return body
+
+    def substitute_headers(self, headers: Dict[str, str], tokens: Dict[str, str]) -> Dict[str, str]:
+        replayed = {}
+        for name, value in headers.items():
+            if name in _DROPPED_HEADERS:
+                continue
+            for old, new in tokens.items():
+                value = value.replace(old, new)
+            replayed[name] = value
+        return replayed
+
+    def replay(self, credentials: Dict[str, str]) -> List[Dict]:
+        """
+        Replay the recording as another user and return the entries it produced.
+
+        Logins are sent with the user's credentials, and the tokens and ids in their
+        responses replace the recorded ones in every later request.
+        """
+        username = credentials['username']
+        tokens: Dict[str, str] = {}
+        ids: IdMap = {}
+        entries = []
+
+        for recorded in self.recorded_entries():
+            request = recorded['request']
+            login = self.is_login(request)
+            kind = self.resource_kind(request)
+            if login:
+                body = self.login_body(request.get('post_data'), credentials)
+            else:
+                body = self.substitute_body(request.get('post_data'), ids, kind)
+            url = self.substitute_url(request['url'], ids)
+            headers = self.substitute_headers(request.get('headers', {}), tokens)
+
+            try:
+                response = self.transport.send(request['method'], url, headers, body)
+            except Exception as e:
+                print(f"⚠️ Replay of {request['method']} {url} as {username} failed: {str(e)}")
+                continue
+
+            recorded_body = _parse_body(recorded['response'].get('body'))
+            if login:
+                # The recorded user's tokens stand for this user's from now on
+                new_tokens = _find_tokens(response)
+                tokens.update(zip(_find_tokens({
+                    'body': recorded_body,
+                    'headers': recorded['response'].get('headers', {})
+                }), new_tokens))
+            self.learn_ids(recorded_body, response['body'], ids, kind)
+
+            replayed_body = response['body']
+            if replayed_body is not None and not isinstance(replayed_body, str):
+                replayed_body = json.dumps(replayed_body, indent=2)
+            entries.append({
+                'id': len(entries) + 1,
+                'timestamp': datetime.now().isoformat(),
+                'user': username,
+                'request': {
+                    'url': url,
+                    'method': request['method'],
+                    'headers': headers,
+                    'post_data': body,
+                    'resource_type': request.get('resource_type')
+                },
+                'response': {
+                    'status': response['status'],
+                    'status_text': '',
+                    'headers': response['headers'],
+                    'body': replayed_body
+                }
+            })
+            print(f"🔁 {username}: {request['method']} {url} -> {response['status']}")
+        return entries
+
+    def save(self, entries: List[Dict], credentials: Dict[str, str], start_url: str = '') -> str:
+        """Save replayed entries as a network log in the crawler's JSON format."""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"network_log_{timestamp}_{credentials['username']}.json"
+        with open(filename, 'w') as f:
+            json.dump({
+                'metadata': {
+                    'start_url': start_url,
+                    'timestamp': datetime.now().isoformat(),
+                    'total_requests': len(entries),
+                    'user': credentials['username'],
+                    'replayed_from': self.recorded_log
+                },
+                'requests': entries
+            }, f, indent=2)
+        print(f"💾 Saved replayed network log to {filename}")
+        return filename
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add this directory and its parent to the path so api_replay and the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+from api_replay import ApiReplayer
+from fuzzer.transport import Transport
+from oracle.oracle import PathTemplateTrie
+
+ALICE_TOKEN = "eyJhbGciOiJIUzI1NiJ9.eyJ1c2VyX2lkIjoxfQ.alice"
+BOB_TOKEN = "eyJhbGciOiJIUzI1NiJ9.eyJ1c2VyX2lkIjozfQ.bob"
+
+class FakeAppTransport(Transport):
+    """Answers as the lab app would for bob, who is user 3 with test result 7."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, method, url, headers, body=None):
+        self.sent.append((method, url, dict(headers), body))
+        if url.endswith("/api/login"):
+            body = {"id": 3, "username": body["username"], "token": BOB_TOKEN}
+            headers = {"set-cookie": f"session_token={BOB_TOKEN}; Path=/"}
+        elif "/api/test-results/" in url:
+            body, headers = [{"id": 7, "doctor_id": 2}], {}
+        else:
+            body, headers = {"id": 3}, {}
+        return {"status": 200, "body": body, "headers": headers, "timing": {}}
+
+def _entry(entry_id, method, url, headers, post_data, response_body, response_headers=None):
+    return {
+        "id": entry_id,
+        "timestamp": "2025-02-16T05:42:50",
+        "user": "alice",
+        "request": {"url": url, "method": method, "headers": headers, "post_data": post_data},
+        "response": {
+            "status": 200,
+            "status_text": "OK",
+            "headers": response_headers or {},
+            "body": json.dumps(response_body, indent=2)
+        }
+    }
+
+class TestApiReplayer(unittest.TestCase):
+    def setUp(self):
+        auth = {"authorization": f"Bearer {ALICE_TOKEN}", "cookie": f"session_token={ALICE_TOKEN}"}
+        base = "http://localhost:3000"
+        entries = [
+            _entry(1, "POST", f"{base}/api/login", {"content-type": "application/json"},
+                   {"username": "alice", "password": "secret"},
+                   {"id": 1, "username": "alice", "token": ALICE_TOKEN},
+                   {"set-cookie": f"session_token={ALICE_TOKEN}; Path=/"}),
+            # Alice is patient 1, and her test result is also 1
+            _entry(2, "GET", f"{base}/api/test-results/1", auth, None, [{"id": 1, "doctor_id": 2}]),
+            _entry(3, "POST", f"{base}/api/test-results", auth,
+                   {"patient_id": 1, "doctor_id": 2, "test_type": "blood"}, {"id": 1}),
+            _entry(4, "PATCH", f"{base}/api/users/1", auth, {"username": "alice"}, {"id": 1})
+        ]
+        fd, self.log = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"metadata": {}, "requests": entries}, f)
+        self.addCleanup(os.remove, self.log)
+
+    def _replay(self, **options):
+        transport = FakeAppTransport()
+        replayer = ApiReplayer(self.log, "alice", transport=transport, **options)
+        replayer.replay({"username": "bob", "password": "hunter2"})
+        return transport.sent
+
+    def test_login_tokens_replace_recorded_ones(self):
+        """Test that logins use the user's credentials and their tokens replace the recorded ones"""
+        sent = self._replay()
+        self.assertEqual(sent[0][3], {"username": "bob", "password": "hunter2"})
+        for _, _, headers, _ in sent[1:]:
+            self.assertEqual(headers["authorization"], f"Bearer {BOB_TOKEN}")
+            self.assertEqual(headers["cookie"], f"session_token={BOB_TOKEN}")
+
+    def test_ids_are_chased_per_resource(self):
+        """Test that learned ids only replace ids of the same resource, however equal their values"""
+        templates = PathTemplateTrie(["/api/login", "/api/test-results", "/api/test-results/{patientId}",
+                                      "/api/users/{userId}"])
+        sent = self._replay(path_templates=templates, id_aliases={"patient": "user"})
+        self.assertEqual([url.split(":3000")[1] for _, url, _, _ in sent],
+                         ["/api/login", "/api/test-results/3", "/api/test-results", "/api/users/3"])
+        self.assertEqual(sent[2][3], {"patient_id": 3, "doctor_id": 2, "test_type": "blood"})
+
+        # Test result 1 became 7, which must not leak into the user ids
+        sent = self._replay()
+        self.assertEqual(sent[3][1], "http://localhost:3000/api/users/3")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import tempfile
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+# Add this directory and its parent to the path so web_crawler and the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+from web_crawler import SessionStore, WebCrawler, element_signature, normalize_url_path, token_expiry
+from oracle.network_log import iter_log_entries
+
+def _jwt(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload}.signature"
+
+def _request(url, method="GET", resource_type="xhr", post_data=None, headers=None):
+    """Stand-in for a Playwright Request with the attributes the crawler reads"""
+    return SimpleNamespace(url=url, method=method, resource_type=resource_type, post_data=post_data,
+                           headers=headers or {"content-type": "application/json"})
+
+def _descriptor(tag, text="", href="", visible=True, selector=""):
+    return {"fingerprint": f"{tag}|{text}|{href}", "tag": tag, "text": text, "href": href,
+            "visible": visible, "selector": selector}
+
+# A small app: the elements on each page, and the API call each element's click sends
+FAKE_APP = {
+    "/": [_descriptor("a", "Patients", "/patients", selector="#patients"),
+          _descriptor("a", "Tests", "/tests", selector="#tests"),
+          _descriptor("button", "Refresh", selector="#refresh")],
+    "/patients": [_descriptor("button", "Alice", selector="#alice"), _descriptor("button", "Bob", selector="#bob"),
+                  _descriptor("button", "Carol", selector="#carol"), _descriptor("a", "Home", "/", selector="#home")],
+    "/tests": [_descriptor("button", "New", selector="#new"), _descriptor("button", "Old", selector="#old"),
+               _descriptor("a", "Home", "/", selector="#home")]
+}
+FAKE_API = {
+    "#patients": ("GET", "/api/patients"), "#alice": ("GET", "/api/patients/a"),
+    "#bob": ("GET", "/api/patients/b"), "#carol": ("GET", "/api/patients/c"),
+    "#tests": ("GET", "/api/tests"), "#new": ("POST", "/api/tests"),
+    "#old": ("DELETE", "/api/tests"), "#refresh": ("GET", "/api/refresh")
+}
+
+class Crash(BaseException):
+    """Stops a crawl the way a killed process would, past every except Exception"""
+
+class FakeDriver:
+    """Counts clicks across every page of a crawl and crashes once a limit is reached."""
+
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.clicks = 0
+
+class FakePage:
+    """Stand-in for a Playwright page on FAKE_APP that logs each click's API call through the crawler."""
+
+    def __init__(self, crawler, user, driver):
+        self.crawler = crawler
+        self.user = user
+        self.driver = driver
+        self.url = "http://app.test/"
+
+    async def goto(self, url):
+        self.url = url
+
+    async def query_selector(self, selector):
+        return None
+
+    async def click(self, selector, timeout=0):
+        self.driver.clicks += 1
+        if self.driver.crash_after is not None and self.driver.clicks > self.driver.crash_after:
+            raise Crash()
+        element = next(e for e in FAKE_APP[self.path] if e["selector"] == selector)
+        if selector in FAKE_API:
+            method, path = FAKE_API[selector]
+            request = _request(f"http://app.test{path}", method=method)
+            self.crawler._note_endpoint(self, request, self.user)
+            request_id = await self.crawler.log_request(request, self.user)
+            # Let the other user's crawl run between the request and its response
+            await asyncio.sleep(0)
+            await self.crawler.log_response({"request": request, "request_id": request_id, "status": 200,
+                                             "status_text": "OK", "headers": {}, "body": None})
+        if element["href"]:
+            self.url = f"http://app.test{element['href']}"
+
+    @property
+    def path(self):
+        return self.url[len("http://app.test"):]
+
+class CrawlerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.credentials_file = os.path.join(self.tmp_dir.name, "credentials.csv")
+        with open(self.credentials_file, "w") as f:
+            f.write("username,password,role\nalice,secret,patient\nbob,hunter2,doctor\n")
+        self.crawler = WebCrawler("http://localhost:3000/", self.credentials_file)
+
+class TestRequestLogging(CrawlerTestCase):
+    def test_responses_pair_with_requests_by_id(self):
+        """Test that responses finish the entry of the request id they were logged under, in any order"""
+        first = _request("http://localhost:3000/api/users/1")
+        second = _request("http://localhost:3000/api/users", method="POST", post_data='{"username": "carol"}')
+        first_id = asyncio.run(self.crawler.log_request(first, "alice"))
+        second_id = asyncio.run(self.crawler.log_request(second, "bob"))
+
+        for request, request_id, body in [(second, second_id, '{"id": 2}'), (first, first_id, '{"id": 1}')]:
+            asyncio.run(self.crawler.log_response({
+                "request": request,
+                "request_id": request_id,
+                "status": 200,
+                "status_text": "OK",
+                "headers": {"content-type": "application/json"},
+                "body": body
+            }))
+        # A response whose request was never logged is dropped
+        asyncio.run(self.crawler.log_response({"request": first, "request_id": 99}))
+
+        first_entry, second_entry = self.crawler.network_log
+        self.assertEqual((first_entry["id"], first_entry["user"]), (first_id, "alice"))
+        self.assertEqual(json.loads(first_entry["response"]["body"]), {"id": 1})
+        self.assertEqual((second_entry["user"], second_entry["request"]["post_data"]), ("bob", {"username": "carol"}))
+        self.assertEqual(json.loads(second_entry["response"]["body"]), {"id": 2})
+        self.assertEqual(self.crawler.pending_requests, {})
+
+    def test_ignored_requests_are_not_logged(self):
+        """Test that requests the crawler should not log get no id"""
+        request = _request("http://localhost:3000/static/app.js", resource_type="script")
+        self.assertIsNone(asyncio.run(self.crawler.log_request(request, "alice")))
+        self.assertEqual(self.crawler.network_log, [])
+
+    def test_include_and_ignore_patterns(self):
+        """Test that ignore patterns and resource types win over include patterns"""
+        should_log = self.crawler.should_log_request
+        self.assertTrue(should_log("http://localhost:3000/api/users/1", "xhr"))
+        self.assertTrue(should_log("http://localhost:3000/login", "document"))
+        self.assertFalse(should_log("http://localhost:3000/about", "document"))
+        self.assertFalse(should_log("http://localhost:3000/api/static/logo.svg", "xhr"))
+        self.assertFalse(should_log("http://localhost:3000/api/users/1", "image"))
+
+        self.crawler.include_patterns = []
+        self.crawler.compile_patterns()
+        self.assertTrue(should_log("http://localhost:3000/about", "document"))
+        self.assertFalse(should_log("http://localhost:3000/main.css", "document"))
+
+    def test_route_pattern(self):
+        """Test that only loggable URLs are routed through Python unless lean mode must see everything"""
+        self.assertIs(self.crawler.route_pattern, self.crawler._include_regex)
+        self.crawler.lean = True
+        self.assertEqual(self.crawler.route_pattern, "**/*")
+
+class TestStateHash(CrawlerTestCase):
+    def test_ids_are_masked(self):
+        """Test that numeric, UUID and object id path segments compare equal"""
+        self.assertEqual(normalize_url_path("http://localhost:3000/patients/12/tests?tab=1"), "/patients/{id}/tests")
+        self.assertEqual(normalize_url_path("http://x/a/123e4567-e89b-12d3-a456-426614174000"), "/a/{id}")
+        self.assertEqual(normalize_url_path("http://x/a/507f1f77bcf86cd799439011"), "/a/{id}")
+        self.assertEqual(normalize_url_path("http://x/v2/api"), "/v2/api")
+
+    def test_element_signature(self):
+        """Test that elements are identified by what they do, not by the data they show"""
+        self.assertEqual(element_signature(_descriptor("a", "Alice", "/patients/1")),
+                         element_signature(_descriptor("a", "Bob", "/patients/2")))
+        self.assertEqual(element_signature(_descriptor("button", "Delete test 7")), "button|Delete test #")
+        self.assertNotEqual(element_signature(_descriptor("button", "Delete")),
+                            element_signature(_descriptor("button", "Share")))
+
+    def test_pages_differing_only_in_ids_share_a_state(self):
+        """Test that state hashes mask ids in URLs and links and ignore invisible elements"""
+        def state(url, descriptors):
+            return asyncio.run(self.crawler.state_hash(SimpleNamespace(url=url), descriptors))
+
+        patient_1 = state("http://localhost:3000/patients/1", [
+            _descriptor("a", "Test 3", "/tests/3"), _descriptor("button", "Edit"), _descriptor("button", "Hidden", visible=False)
+        ])
+        patient_2 = state("http://localhost:3000/patients/2", [
+            _descriptor("button", "Edit"), _descriptor("a", "Test 8", "/tests/8")
+        ])
+        self.assertEqual(patient_1, patient_2)
+        self.assertNotEqual(patient_1, state("http://localhost:3000/patients/2", [_descriptor("button", "Edit")]))
+        self.assertNotEqual(patient_1, state("http://localhost:3000/doctors/2", [
+            _descriptor("button", "Edit"), _descriptor("a", "Test 8", "/tests/8")
+        ]))
+
+class TestCheckpoints(CrawlerTestCase):
+    def setUp(self):
+        super().setUp()
+        # Crawls write their log and checkpoint to the working directory
+        previous = os.getcwd()
+        self.addCleanup(os.chdir, previous)
+        os.chdir(self.tmp_dir.name)
+
+    def checkpointing_crawler(self):
+        crawler = WebCrawler("http://app.test/", self.credentials_file, log_format="ndjson", parallel=True,
+                             checkpoint_file="checkpoint.json", checkpoint_interval=0, coverage_patience=None)
+        
+        async def settle(page):
+            await asyncio.sleep(0)
+            return 0.0
+        
+        async def describe_clickable_elements(page):
+            return FAKE_APP[page.path]
+        
+        crawler.settle = settle
+        crawler.describe_clickable_elements = describe_clickable_elements
+        return crawler
+
+    def crawl(self, crash_after=None, resume=False):
+        """Crawl FAKE_APP as both users at once, as run_parallel does, crashing after crash_after clicks"""
+        crawler = self.checkpointing_crawler()
+        driver = FakeDriver(crash_after)
+        
+        async def crawl_as(user):
+            crawler.current_user = user
+            crawler.visited_urls_by_user.setdefault(user, set())
+            if crawler.crawl_key(user) in crawler.completed_crawls:
+                return
+            await crawler.explore_frontier(FakePage(crawler, user, driver))
+            crawler.completed_crawls.add(crawler.crawl_key(user))
+            crawler.frontiers.pop(crawler.crawl_key(user), None)
+            crawler.save_checkpoint()
+        
+        async def run():
+            if resume:
+                crawler.load_checkpoint()
+            crawler.open_network_log()
+            try:
+                await asyncio.gather(crawl_as("alice"), crawl_as("bob"))
+            except Crash:
+                pass
+            finally:
+                crawler.save_network_log()
+                crawler.clear_checkpoint()
+        
+        asyncio.run(run())
+        return crawler
+
+    def logged(self, log_file):
+        return [(e["user"], e["request"]["method"], e["request"]["url"]) for e in iter_log_entries(log_file)]
+
+    def read_checkpoint(self):
+        with open("checkpoint.json") as f:
+            checkpoint = json.load(f)
+        checkpoint.pop("elapsed")
+        for progress in checkpoint["frontiers"].values():
+            progress["frontier"].sort()
+        return checkpoint
+
+    def test_checkpoint_round_trip(self):
+        """Test that a loaded checkpoint is saved back unchanged"""
+        self.crawl(crash_after=5)
+        saved = self.read_checkpoint()
+        self.assertEqual(saved["completed_crawls"], [])
+        self.assertEqual(set(saved["frontiers"]), {"alice#0", "bob#0"})
+        
+        crawler = self.checkpointing_crawler()
+        self.assertTrue(crawler.load_checkpoint())
+        crawler.open_network_log()
+        crawler.save_checkpoint()
+        crawler.log_writer.close()
+        self.assertEqual(self.read_checkpoint(), saved)
+
+    def test_resume_truncates_the_log(self):
+        """Test that entries logged after the checkpoint are cut from the log when resuming"""
+        crashed = self.crawl(crash_after=7)
+        logged = self.logged(crashed.log_file)
+        with open("checkpoint.json") as f:
+            checkpoint = json.load(f)
+        
+        self.checkpointing_crawler().load_checkpoint()
+        kept = self.logged(crashed.log_file)
+        self.assertLess(len(kept), len(logged))
+        self.assertEqual(kept, logged[:len(kept)])
+        self.assertTrue(all(entry["id"] <= checkpoint["request_counter"] for entry in iter_log_entries(crashed.log_file)))
+
+    def test_crash_at_any_click_resumes_to_a_complete_log(self):
+        """Test that a crawl crashed after any click and resumed logs what an uninterrupted crawl does, once"""
+        os.mkdir("complete")
+        os.chdir("complete")
+        complete = self.crawl()
+        expected = set(self.logged(complete.log_file))
+        self.assertFalse(os.path.exists("checkpoint.json"))
+        
+        for crash_after in range(1, 14):
+            with self.subTest(crash_after=crash_after):
+                os.mkdir(os.path.join(self.tmp_dir.name, str(crash_after)))
+                os.chdir(os.path.join(self.tmp_dir.name, str(crash_after)))
+                self.crawl(crash_after=crash_after)
+                self.assertTrue(os.path.exists("checkpoint.json"))
+                logged = self.logged(self.crawl(resume=True).log_file)
+                self.assertEqual(set(logged), expected)
+                self.assertEqual(len(logged), len(set(logged)))
+                self.assertFalse(os.path.exists("checkpoint.json"))
+
+class TestSessions(unittest.TestCase):
+    def test_token_expiry(self):
+        """Test that the earliest JWT or cookie expiry is found, and session cookies are ignored"""
+        state = {
+            "cookies": [
+                {"name": "session_token", "value": _jwt({"user_id": 1, "exp": 2000}), "expires": -1},
+                {"name": "prefs", "value": "dark", "expires": 3000}
+            ],
+            "origins": [{"origin": "http://localhost:3000", "localStorage": [
+                {"name": "token", "value": f"Bearer {_jwt({'exp': 1500})}"},
+                {"name": "other", "value": "eyJnot.a-token."}
+            ]}]
+        }
+        self.assertEqual(token_expiry(state), 1500)
+        self.assertEqual(token_expiry({"cookies": [{"name": "prefs", "value": "dark", "expires": 3000}]}), 3000)
+        self.assertIsNone(token_expiry({"cookies": [{"name": "sid", "value": _jwt({"user_id": 1}), "expires": -1}]}))
+
+    def test_snapshots_expire(self):
+        """Test that snapshots are restored until shortly before they expire, and removed after"""
+        with tempfile.TemporaryDirectory() as session_dir:
+            store = SessionStore(session_dir, default_ttl=3600, margin=60)
+            url = "http://localhost:3000/"
+            fresh = {"cookies": [{"name": "sid", "value": _jwt({"exp": time.time() + 600}), "expires": -1}]}
+            stale = {"cookies": [{"name": "sid", "value": _jwt({"exp": time.time() + 30}), "expires": -1}]}
+            untimed = {"cookies": [{"name": "sid", "value": "opaque", "expires": -1}]}
+
+            store.put(url, "alice", fresh)
+            store.put(url, "bob", stale)
+            store.put(url, "carol", untimed)
+            self.assertEqual(store.get(url, "alice"), fresh)
+            self.assertIsNone(store.get(url, "bob"))
+            self.assertFalse(os.path.exists(store.path_for(url, "bob")))
+            # Without an expiry in the state, the snapshot is trusted for default_ttl
+            self.assertEqual(store.get(url, "carol"), untimed)
+            self.assertIsNone(SessionStore(session_dir, default_ttl=3600, margin=3600).get(url, "carol"))
+            self.assertIsNone(store.get("http://localhost:4000/", "alice"))
+
+if __name__ == '__main__':
+    unittest.main()
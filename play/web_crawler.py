@@ -1,16 +1,263 @@
+import argparse
 import asyncio
+import base64
+import binascii
 import csv
+import hashlib
+import heapq
 import json
+import os
 import re
+import sys
+import time
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright, Browser, Page, Request, Response
+from playwright.async_api import async_playwright, Browser, BrowserContext, CDPSession, Page, Request, Response
+
+# Add this directory and its parent to the path so api_replay and the oracle package can be imported
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+from oracle.body_store import BodyStore
+from oracle.network_log import NetworkLogWriter, truncate_log
 
 load_dotenv()
 
+# User being crawled by the current task, so parallel crawls each see their own user
+_current_user: ContextVar[Optional[str]] = ContextVar('current_user', default=None)
+
+# Records when the DOM last changed so the crawler can tell when a page has settled
+MUTATION_TRACKER_SCRIPT = """
+(() => {
+    window.__crawlerLastMutation = performance.now();
+    new MutationObserver(() => { window.__crawlerLastMutation = performance.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})();
+"""
+
+# Selector of the elements explore_page clicks
+CLICKABLE_SELECTOR = 'a, button, input[type="submit"]'
+
+# Describes every element matching a selector in one round trip: a fingerprint, tag, text, href,
+# visibility and a CSS path that finds the element again for clicking
+ELEMENT_DESCRIPTORS_SCRIPT = """
+(selector) => {
+    const cssPath = (el) => {
+        const parts = [];
+        while (el && el.nodeType === Node.ELEMENT_NODE && el !== document.documentElement) {
+            if (el.id && document.querySelectorAll('#' + CSS.escape(el.id)).length === 1) {
+                parts.unshift('#' + CSS.escape(el.id));
+                break;
+            }
+            let index = 1;
+            for (let sibling = el.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+                if (sibling.tagName === el.tagName) index++;
+            }
+            parts.unshift(`${el.tagName.toLowerCase()}:nth-of-type(${index})`);
+            el = el.parentElement;
+        }
+        return parts.join(' > ');
+    };
+    return Array.from(document.querySelectorAll(selector), (el) => {
+        const tag = el.tagName.toLowerCase();
+        const text = (el.textContent || '').replace(/\\s+/g, ' ').trim().slice(0, 200);
+        const href = el.getAttribute('href') || '';
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        return {
+            fingerprint: [tag, text, href, el.id, el.getAttribute('class') || ''].join('|'),
+            tag: tag,
+            text: text,
+            href: href,
+            visible: rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none',
+            selector: cssPath(el)
+        };
+    });
+}
+"""
+
+# Resource types never logged, and those a lean crawl aborts because the app works without them
+IGNORED_RESOURCE_TYPES = frozenset({'stylesheet', 'image', 'font', 'other'})
+LEAN_ABORT_RESOURCE_TYPES = frozenset({'image', 'font', 'media'})
+
+# URL patterns blocked through CDP in lean mode, which has no per-request hook to abort by resource type
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.ico', '*.svg',
+    '*.woff', '*.woff2', '*.ttf', '*.eot', '*.otf',
+    '*.mp4', '*.webm', '*.mp3', '*.ogg'
+]
+
+# Path segments that hold record ids rather than naming a page or endpoint
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{24,})$')
+
+def normalize_url_path(url: str) -> str:
+    """Path of a URL with id segments replaced by {id}, so /patients/1 and /patients/2 compare equal"""
+    path = urlparse(url).path
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+def element_signature(descriptor: Dict) -> str:
+    """
+    Identify what an element does rather than what data it shows: links by their target
+    and other elements by their label, with numbers masked.
+    """
+    if descriptor['href']:
+        return f"{descriptor['tag']}|{normalize_url_path(descriptor['href'])}"
+    return f"{descriptor['tag']}|{re.sub(r'[0-9]+', '#', descriptor['text'])}"
+
+# A JSON Web Token: base64url header, payload and signature
+_JWT = re.compile(r'eyJ[\w-]+\.([\w-]+)\.[\w-]*')
+
+def token_expiry(storage_state: Dict) -> Optional[float]:
+    """
+    Earliest expiry, as a Unix timestamp, of the JWTs and expiring cookies in a
+    Playwright storage state, or None if nothing in it says when it expires.
+    """
+    expiries = [cookie['expires'] for cookie in storage_state.get('cookies', []) if cookie.get('expires', -1) > 0]
+    values = [cookie['value'] for cookie in storage_state.get('cookies', [])]
+    values += [item['value'] for origin in storage_state.get('origins', []) for item in origin.get('localStorage', [])]
+    for value in values:
+        for match in _JWT.finditer(value):
+            payload = match.group(1)
+            try:
+                claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+            except (binascii.Error, ValueError):
+                continue
+            if isinstance(claims, dict) and isinstance(claims.get('exp'), (int, float)):
+                expiries.append(claims['exp'])
+    return min(expiries) if expiries else None
+
+class SessionStore:
+    def __init__(self, session_dir: str, default_ttl: float = 3600.0, margin: float = 60.0):
+        """
+        Initialize a store of logged-in browser storage states, one file per credential.
+
+        Args:
+            session_dir: Directory holding the snapshots
+            default_ttl: Seconds a snapshot is trusted when it holds no token or cookie expiry
+            margin: Seconds before expiry at which a snapshot is already treated as stale
+        """
+        self.session_dir = session_dir
+        self.default_ttl = default_ttl
+        self.margin = margin
+
+    def path_for(self, start_url: str, username: str) -> str:
+        key = hashlib.sha1(f"{start_url}\0{username}".encode('utf-8')).hexdigest()
+        return os.path.join(self.session_dir, f"{key}.json")
+
+    def get(self, start_url: str, username: str) -> Optional[Dict]:
+        """Return the saved storage state for a user, or None if there is none or it has expired."""
+        path = self.path_for(start_url, username)
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get('expires_at', 0) - self.margin <= time.time():
+            self.invalidate(start_url, username)
+            return None
+        return snapshot['storage_state']
+
+    def put(self, start_url: str, username: str, storage_state: Dict) -> str:
+        """Save a user's storage state together with when it expires."""
+        os.makedirs(self.session_dir, exist_ok=True)
+        path = self.path_for(start_url, username)
+        expires_at = token_expiry(storage_state) or time.time() + self.default_ttl
+        
+        # Write to a temporary file first so readers never see a partial snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'username': username, 'expires_at': expires_at, 'storage_state': storage_state}, f)
+        os.replace(tmp_path, path)
+        return path
+
+    def invalidate(self, start_url: str, username: str) -> bool:
+        """Remove a user's snapshot. Returns True if one existed."""
+        path = self.path_for(start_url, username)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
+
+class CDPRequest:
+    """Request seen through the DevTools Network domain, with the attributes the crawler reads from Playwright requests"""
+
+    def __init__(self, params: Dict, page: Optional[Page] = None):
+        request = params['request']
+        self.url = request['url']
+        self.method = request['method']
+        self.headers = {k.lower(): v for k, v in request.get('headers', {}).items()}
+        self.post_data = request.get('postData')
+        # CDP types are capitalised versions of Playwright's, e.g. 'XHR' and 'Fetch'
+        self.resource_type = params.get('type', 'Other').lower()
+        self.page = page
+
 class WebCrawler:
-    def __init__(self, start_url: str, credentials_file: str):
+    def __init__(
+        self,
+        start_url: str,
+        credentials_file: str,
+        log_format: str = 'json',
+        flush_interval: float = 1.0,
+        max_log_bytes: Optional[int] = None,
+        parallel: bool = False,
+        max_parallel_contexts: int = 4,
+        contexts_per_user: int = 1,
+        settle_quiet_ms: int = 250,
+        settle_timeout: float = 5.0,
+        lean: bool = False,
+        capture: str = 'route',
+        strategy: str = 'frontier',
+        max_actions: int = 200,
+        max_depth: int = 5,
+        openapi_spec: Optional[str] = None,
+        coverage_patience: Optional[int] = 30,
+        session_dir: Optional[str] = None,
+        checkpoint_file: Optional[str] = None,
+        checkpoint_interval: float = 60.0,
+        body_store_dir: Optional[str] = None,
+        max_body_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the crawler.
+        
+        Args:
+            start_url: URL the crawl starts from
+            credentials_file: CSV file with username, password and role columns
+            log_format: 'json' to write the whole log at the end, or 'ndjson' to append
+                each completed entry as it happens
+            flush_interval: Seconds between fsyncs of the NDJSON log
+            max_log_bytes: Size at which the NDJSON log rotates to a new file, or None
+            parallel: Crawl every user at once, each in its own isolated browser context
+            max_parallel_contexts: Maximum number of browser contexts crawling at the same time
+            contexts_per_user: Number of contexts per user in parallel mode; each one explores
+                a disjoint share of the start page's elements
+            settle_quiet_ms: How long the page must see no API requests and no DOM changes to count as settled
+            settle_timeout: Upper bound in seconds on waiting for a page to settle
+            lean: Abort images, fonts and media instead of loading them
+            capture: 'route' to intercept requests with page routing, or 'cdp' to observe them
+                passively through Chrome DevTools Protocol network events (Chromium only)
+            strategy: 'frontier' to explore distinct page states breadth-first, or 'dfs' to
+                click through every page recursively
+            max_actions: Maximum number of clicks per user with the frontier strategy
+            max_depth: Maximum number of clicks away from the start page to explore
+            openapi_spec: Path of the app's OpenAPI spec in JSON. Coverage is then measured
+                against its operations and reported at the end of the crawl
+            coverage_patience: With the frontier strategy, stop a user's crawl once this many
+                clicks in a row found no new endpoint, or None to always use the whole budget
+            session_dir: Directory to save each user's logged-in storage state in. Saved sessions
+                that have not expired are restored instead of logging in through the UI
+            checkpoint_file: JSON file to periodically save crawl progress to, so that an
+                interrupted crawl can be resumed. Requires log_format='ndjson'
+            checkpoint_interval: Minimum seconds between checkpoints
+            body_store_dir: Directory to store request and response bodies in, compressed and
+                once per distinct body. Log entries then only keep a reference to the body
+            max_body_bytes: Bodies larger than this are truncated in the body store
+        """
         self.start_url = start_url
         self.credentials = self.load_credentials(credentials_file)
         self.visited_urls_by_user = {}  # Initialize empty dict
@@ -18,6 +265,55 @@ class WebCrawler:
         self.current_user = None
         self.request_counter = 0
         self.network_log = []
+        self.pending_requests: Dict[int, Dict] = {}  # Logged requests awaiting their response, by id
+        self.log_format = log_format
+        self.flush_interval = flush_interval
+        self.max_log_bytes = max_log_bytes
+        self.log_writer = None
+        self.log_file = None
+        self.parallel = parallel
+        self.max_parallel_contexts = max_parallel_contexts
+        self.contexts_per_user = contexts_per_user
+        self.settle_quiet_ms = settle_quiet_ms
+        self.settle_timeout = settle_timeout
+        self.settle_times: List[float] = []
+        self.inflight_requests: Dict[Page, int] = {}  # API requests in flight per page
+        self.last_network_activity: Dict[Page, float] = {}  # Loop time of the last API request start/finish per page
+        self.lean = lean
+        if capture not in ('route', 'cdp'):
+            raise ValueError(f"Unknown capture backend: {capture}")
+        self.capture = capture
+        self.cdp_requests: Dict[str, Dict] = {}  # In-flight logged requests by CDP request id
+        if strategy not in ('frontier', 'dfs'):
+            raise ValueError(f"Unknown crawl strategy: {strategy}")
+        self.strategy = strategy
+        self.max_actions = max_actions
+        self.max_depth = max_depth
+        self.visited_states: Set[Tuple[str, str]] = set()  # (user or crawl_key, state hash) pairs already explored
+        self.user_exercised_endpoints: Dict[str, Set[str]] = {}  # 'METHOD /path/{id}' of every API request each user sent
+        self.action_endpoints: Dict[Tuple[str, str], Set[str]] = {}  # Endpoints each (state, action) triggered
+        self.action_targets: Dict[Tuple[str, str], str] = {}  # URL each (state, action) navigated to
+        self.page_endpoints: Dict[Page, Set[str]] = {}  # Endpoints requested by each page since the last reset
+        self.coverage_patience = coverage_patience
+        self.covered_operations: Dict[Tuple[str, str], float] = {}  # (method, template) -> seconds into the crawl it was first seen
+        self.page_new_coverage: Dict[Page, int] = {}  # Operations each page covered first since the last reset
+        self.user_covered_operations: Dict[str, Set[Tuple[str, str]]] = {}  # (method, template) pairs each user exercised
+        self.page_new_user_coverage: Dict[Page, int] = {}  # Operations new to each page's user since the last reset
+        self.action_yield: Dict[str, Tuple[int, int]] = {}  # Element signature -> (new operations found, times clicked)
+        self.crawl_started = time.monotonic()
+        self.spec_operations: Set[Tuple[str, str]] = set()
+        self.template_trie = None
+        self.session_store = SessionStore(session_dir) if session_dir else None
+        if checkpoint_file and log_format != 'ndjson':
+            raise ValueError("Checkpoints need log_format='ndjson' so the log can be resumed")
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+        self.frontiers: Dict[str, Dict] = {}  # Frontier progress per crawl_key
+        self.completed_crawls: Set[str] = set()  # crawl_keys whose exploration finished
+        self.body_store = BodyStore(body_store_dir, max_body_bytes=max_body_bytes) if body_store_dir else None
+        if openapi_spec:
+            self.load_openapi_spec(openapi_spec)
         self.logout_keywords = ['logout', 'sign out', 'signout']
         self.login_keywords = ['login', 'log-in', 'signin', 'sign-in']
         self.base_url = re.match(r'https?://[^/]+', start_url).group(0)
@@ -72,23 +368,52 @@ class WebCrawler:
             r'/logout',
             r'/signup'
         ]
+        self.compile_patterns()
+
+    @property
+    def current_user(self) -> Optional[str]:
+        # Playwright runs route handlers outside the crawling task, so fall back to the last user set
+        user = _current_user.get()
+        return user if user is not None else self._last_user
+
+    @current_user.setter
+    def current_user(self, username: Optional[str]):
+        _current_user.set(username)
+        self._last_user = username
+
+    def compile_patterns(self):
+        """Combine the ignore and include patterns into single regexes. Call again after changing either list."""
+        def combine(patterns):
+            return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)) if patterns else None
+        self._ignore_regex = combine(self.ignore_patterns)
+        self._include_regex = combine(self.include_patterns)
 
     def should_log_request(self, url: str, resource_type: str) -> bool:
         """Determine if a request should be logged based on URL and resource type"""
         # Always ignore certain resource types
-        if resource_type in ['stylesheet', 'image', 'font', 'other']:
+        if resource_type in IGNORED_RESOURCE_TYPES:
             return False
             
         # Check if URL matches any ignore patterns
-        if any(re.search(pattern, url) for pattern in self.ignore_patterns):
+        if self._ignore_regex and self._ignore_regex.search(url):
             return False
             
         # If we have any include patterns, at least one must match
-        if self.include_patterns:
-            return any(re.search(pattern, url) for pattern in self.include_patterns)
+        if self._include_regex:
+            return self._include_regex.search(url) is not None
             
         return True
 
+    @property
+    def route_pattern(self):
+        """
+        URL pattern to intercept. Without lean mode only URLs that can be logged need to
+        pass through Python, so everything else is left to the browser.
+        """
+        if self._include_regex and not self.lean:
+            return self._include_regex
+        return "**/*"
+
     def load_credentials(self, credentials_file: str) -> List[Dict[str, str]]:
         """Load credentials from CSV file"""
         credentials = []
@@ -120,11 +445,11 @@ class WebCrawler:
             if k.lower() in self.important_request_headers
         }
 
-    async def log_request(self, request: Request):
-        """Log request details"""
+    async def log_request(self, request: Request, user: Optional[str] = None) -> Optional[int]:
+        """Log request details, tagged with the user who made it, and return the id its response must be logged under"""
         # Skip if we shouldn't log this request
         if not self.should_log_request(request.url, request.resource_type):
-            return
+            return None
             
         self.request_counter += 1
         request_id = self.request_counter
@@ -136,8 +461,10 @@ class WebCrawler:
         body = None
         try:
             if request.method in ['POST', 'PUT', 'PATCH']:
-                post_data = await request.post_data()
-                if post_data:
+                post_data = request.post_data
+                if post_data and self.body_store is not None:
+                    body = self.body_store.put(post_data, request.headers.get('content-type'))
+                elif post_data:
                     try:
                         # Try to decode as JSON if it's JSON content
                         if 'application/json' in request.headers.get('content-type', ''):
@@ -153,6 +480,7 @@ class WebCrawler:
         request_data = {
             'id': request_id,
             'timestamp': datetime.now().isoformat(),
+            'user': user if user is not None else self.current_user,
             'request': {
                 'url': request.url,
                 'method': request.method,
@@ -162,57 +490,343 @@ class WebCrawler:
             }
         }
         
-        # Store request data temporarily
-        self.network_log.append(request_data)
+        # Hold the entry until its response arrives; the streaming log only keeps pending entries
+        self.pending_requests[request_id] = request_data
+        if self.log_writer is None:
+            self.network_log.append(request_data)
         print(f"📡 Request #{request_id}: {request.method} {request.url}")
         if body:
             print(f"📦 Request Body: {json.dumps(body, indent=2)}")
+        return request_id
 
     async def log_response(self, response):
         """Log response details"""
         request = response['request']
         
-        # Skip if we shouldn't log this request
-        if not self.should_log_request(request.url, request.resource_type):
+        # Find the corresponding request by the id route_handler attached to it
+        entry = self.pending_requests.pop(response.get('request_id'), None)
+        if entry is None:
             return
+            
+        # Get response headers (keep all response headers)
+        headers = dict(response['headers'])
         
-        # Find the corresponding request in our log
-        for entry in self.network_log:
-            if entry['request']['url'] == request.url and 'response' not in entry:
-                # Get response headers (keep all response headers)
-                headers = dict(response['headers'])
-                
-                # Parse response body if it's JSON
-                body = response['body']
-                if body and 'application/json' in response['headers'].get('content-type', ''):
-                    try:
-                        body = json.loads(body)
-                        body = json.dumps(body, indent=2)
-                    except:
-                        pass
-                
-                # Add response data to the existing entry
-                entry['response'] = {
-                    'status': response['status'],
-                    'status_text': response['status_text'],
-                    'headers': headers,
-                    'body': body
+        # Move the body to the body store, or pretty-print it if it's JSON
+        body = response['body']
+        if body is not None and self.body_store is not None:
+            body = self.body_store.put(body, response['headers'].get('content-type'))
+        elif body and 'application/json' in response['headers'].get('content-type', ''):
+            try:
+                body = json.loads(body)
+                body = json.dumps(body, indent=2)
+            except:
+                pass
+        
+        # Add response data to the existing entry
+        entry['response'] = {
+            'status': response['status'],
+            'status_text': response['status_text'],
+            'headers': headers,
+            'body': body
+        }
+        print(f"📨 Response #{entry['id']}: {response['status']} {request.url}")
+        if body:
+            print(f"📦 Response Body: {body}")
+        self.complete_entry(entry)
+
+    def open_network_log(self):
+        """Start streaming completed entries to an NDJSON log file, or continue the resumed one"""
+        if self.log_file is not None:
+            self.log_writer = NetworkLogWriter(
+                self.log_file,
+                flush_interval=self.flush_interval,
+                max_bytes=self.max_log_bytes
+            )
+            print(f"💾 Continuing network log {self.log_file}")
+            return
+            
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.log_file = f'network_log_{timestamp}.ndjson'
+        self.log_writer = NetworkLogWriter(
+            self.log_file,
+            metadata=self.log_metadata(),
+            flush_interval=self.flush_interval,
+            max_bytes=self.max_log_bytes
+        )
+        print(f"💾 Streaming network log to {self.log_file}")
+
+    def log_metadata(self, log_file: Optional[str] = None) -> Dict:
+        """Metadata at the head of a network log"""
+        metadata = {
+            'start_url': self.start_url,
+            'timestamp': datetime.now().isoformat()
+        }
+        if self.body_store is not None:
+            # Relative to the log, so readers find the store wherever the log is opened from
+            log_dir = os.path.dirname(log_file or self.log_file) or '.'
+            metadata['body_store'] = os.path.relpath(self.body_store.root, log_dir)
+        return metadata
+
+    @staticmethod
+    def crawl_key(username: str, partition_index: int = 0) -> str:
+        """Key of one user's crawl, or of one share of it when a user is crawled by several contexts"""
+        return f"{username}#{partition_index}"
+
+    def save_checkpoint(self):
+        """
+        Write crawl progress to checkpoint_file. Everything logged so far is flushed first,
+        and the log is cut back to the recorded position on resume, so work done after a
+        checkpoint is redone without leaving duplicate entries behind.
+        """
+        if not self.checkpoint_file or self.log_writer is None:
+            return
+        self.log_writer.flush()
+        # In a parallel crawl other contexts may be partway through a state. That state goes
+        # back on their frontier and is not counted as visited, so a resumed crawl explores it
+        # again; actions whose endpoints were already logged are then skipped.
+        in_progress = {key: progress['current'] for key, progress in self.frontiers.items()
+                       if progress.get('current') is not None}
+        checkpoint = {
+            'start_url': self.start_url,
+            'log_file': self.log_file,
+            'log_position': list(self.log_writer.position),
+            'request_counter': self.request_counter,
+            'elapsed': time.monotonic() - self.crawl_started,
+            'completed_crawls': sorted(self.completed_crawls),
+            'frontiers': {
+                key: {
+                    'frontier': progress['frontier'] + ([in_progress[key][0]] if key in in_progress else []),
+                    'order': progress['order'],
+                    'queued': sorted(progress['queued']),
+                    'queued_urls': sorted(progress['queued_urls']),
+                    'actions': progress['actions'],
+                    'since_new_coverage': progress['since_new_coverage']
                 }
-                print(f"📨 Response #{entry['id']}: {response['status']} {request.url}")
-                if body:
-                    print(f"📦 Response Body: {body}")
-                break
+                for key, progress in self.frontiers.items()
+            },
+            'visited_urls_by_user': {user: sorted(urls) for user, urls in self.visited_urls_by_user.items()},
+            'visited_states': sorted(self.visited_states - {visited for _, visited in in_progress.values()}),
+            'user_exercised_endpoints': {user: sorted(endpoints) for user, endpoints in self.user_exercised_endpoints.items()},
+            'action_endpoints': [[state, signature, sorted(endpoints)]
+                                 for (state, signature), endpoints in self.action_endpoints.items()],
+            'action_targets': [[state, signature, url] for (state, signature), url in self.action_targets.items()],
+            'action_yield': self.action_yield,
+            'covered_operations': [[method, template, at] for (method, template), at in self.covered_operations.items()],
+            'user_covered_operations': {user: sorted(operations) for user, operations in self.user_covered_operations.items()}
+        }
+        
+        # Write to a temporary file first so a crash never leaves a partial checkpoint
+        tmp_path = f"{self.checkpoint_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_file)
+        self.last_checkpoint = time.monotonic()
+        print(f"💾 Checkpoint saved after request #{self.request_counter}")
+
+    def clear_checkpoint(self):
+        """Delete checkpoint_file once every crawl has completed, so it is not resumed again"""
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return
+        partitions = range(self.contexts_per_user) if self.parallel else [0]
+        if all(self.crawl_key(credentials['username'], index) in self.completed_crawls
+               for credentials in self.credentials for index in partitions):
+            os.remove(self.checkpoint_file)
+            print(f"🧹 Crawl complete, removed checkpoint {self.checkpoint_file}")
+
+    def maybe_save_checkpoint(self):
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def load_checkpoint(self) -> bool:
+        """Restore crawl progress from checkpoint_file. Returns False if there is nothing to resume."""
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            print(f"⚠️ No checkpoint to resume from, starting a new crawl")
+            return False
+        with open(self.checkpoint_file, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint['start_url'] != self.start_url:
+            raise ValueError(f"Checkpoint is for {checkpoint['start_url']}, not {self.start_url}")
+        
+        # Drop whatever was logged after the checkpoint; that work is about to be redone
+        self.log_file = checkpoint['log_file']
+        truncate_log(self.log_file, *checkpoint['log_position'])
+        self.request_counter = checkpoint['request_counter']
+        self.crawl_started = time.monotonic() - checkpoint['elapsed']
+        self.completed_crawls = set(checkpoint['completed_crawls'])
+        self.frontiers = {
+            key: {
+                # Sorted, so a frontier saved with an in-progress state appended is a valid heap again
+                'frontier': sorted(tuple(item[:4]) + (tuple(item[4]),) for item in progress['frontier']),
+                'order': progress['order'],
+                'queued': set(progress['queued']),
+                'queued_urls': set(progress['queued_urls']),
+                'actions': progress['actions'],
+                'since_new_coverage': progress['since_new_coverage']
+            }
+            for key, progress in checkpoint['frontiers'].items()
+        }
+        self.visited_urls_by_user = {user: set(urls) for user, urls in checkpoint['visited_urls_by_user'].items()}
+        self.visited_states = {tuple(visited) for visited in checkpoint['visited_states']}
+        self.user_exercised_endpoints = {user: set(endpoints)
+                                         for user, endpoints in checkpoint.get('user_exercised_endpoints', {}).items()}
+        self.action_endpoints = {(state, signature): set(endpoints)
+                                 for state, signature, endpoints in checkpoint['action_endpoints']}
+        self.action_targets = {(state, signature): url for state, signature, url in checkpoint['action_targets']}
+        self.action_yield = {signature: tuple(counts) for signature, counts in checkpoint['action_yield'].items()}
+        self.covered_operations = {(method, template): at for method, template, at in checkpoint['covered_operations']}
+        self.user_covered_operations = {user: {tuple(operation) for operation in operations}
+                                        for user, operations in checkpoint.get('user_covered_operations', {}).items()}
+        print(f"🔄 Resuming crawl from {self.checkpoint_file}: {len(self.completed_crawls)} crawls done, "
+              f"continuing after request #{self.request_counter}")
+        return True
+
+    def complete_entry(self, entry: Dict):
+        """Append a finished entry to the streaming log"""
+        if self.log_writer is not None:
+            self.log_writer.write(entry)
+
+    def _request_page(self, request: Request) -> Optional[Page]:
+        if isinstance(request, CDPRequest):
+            return request.page
+        try:
+            return request.frame.page
+        except Exception:
+            return None
+
+    def load_openapi_spec(self, path: str):
+        """Load the operations of an OpenAPI spec to measure crawl coverage against"""
+        # Imported here so the crawler only needs the oracle's dependencies when a spec is given
+        from oracle.oracle import PathTemplateTrie
+        
+        with open(path, 'r') as f:
+            spec = json.load(f)
+        paths = spec.get('paths', {})
+        self.template_trie = PathTemplateTrie(paths)
+        self.spec_operations = {
+            (method.upper(), template)
+            for template, operations in paths.items()
+            for method in operations
+            if method.lower() in ('get', 'put', 'post', 'delete', 'patch', 'head', 'options')
+        }
+        print(f"📘 Loaded {len(self.spec_operations)} operations from {path}")
+
+    def operation_of(self, method: str, url: str) -> Optional[Tuple[str, str]]:
+        """The (method, path template) a request exercises, or None if it is not in the spec"""
+        if self.template_trie is None:
+            return method, normalize_url_path(url)
+        match = self.template_trie.match(urlparse(url).path)
+        return (method, match[0]) if match else None
+
+    def _note_endpoint(self, page: Optional[Page], request: Request, user: Optional[str] = None):
+        """Record the endpoint of a logged request for the user and for the page that sent it"""
+        if user is None:
+            user = self.current_user
+        endpoint = f"{request.method} {normalize_url_path(request.url)}"
+        self.user_exercised_endpoints.setdefault(user, set()).add(endpoint)
+        if page is not None:
+            self.page_endpoints.setdefault(page, set()).add(endpoint)
+            
+        operation = self.operation_of(request.method, request.url)
+        if operation is None:
+            return
+        # Every user's crawl stops on its own coverage, so each user's objects reach the log
+        user_operations = self.user_covered_operations.setdefault(user, set())
+        if operation not in user_operations:
+            user_operations.add(operation)
+            if page is not None:
+                self.page_new_user_coverage[page] = self.page_new_user_coverage.get(page, 0) + 1
+        # Global coverage only decides which actions are tried first
+        if operation not in self.covered_operations:
+            self.covered_operations[operation] = time.monotonic() - self.crawl_started
+            print(f"🆕 Covered {operation[0]} {operation[1]}")
+            if page is not None:
+                self.page_new_coverage[page] = self.page_new_coverage.get(page, 0) + 1
+
+    def action_priority(self, signature: str) -> float:
+        """Expected new operations from clicking an element, optimistic for elements never clicked"""
+        found, clicks = self.action_yield.get(signature, (0, 0))
+        return (found + 1) / (clicks + 1)
+
+    def coverage_complete(self, user: Optional[str] = None) -> bool:
+        """Whether every spec operation was exercised, by the given user or by anyone"""
+        covered = self.covered_operations.keys() if user is None else self.user_covered_operations.get(user, set())
+        return bool(self.spec_operations) and self.spec_operations <= covered
+
+    def coverage_report(self) -> Dict[str, Dict]:
+        """Seconds into the crawl each operation was first exercised, or None if it never was"""
+        operations = self.spec_operations or set(self.covered_operations)
+        return {
+            f"{method} {template}": {'covered': (method, template) in self.covered_operations,
+                                     'time_to_coverage': self.covered_operations.get((method, template))}
+            for method, template in sorted(operations, key=lambda op: (op[1], op[0]))
+        }
+
+    def print_coverage_summary(self):
+        """Print per-template coverage and when each operation was first reached"""
+        report = self.coverage_report()
+        covered = sum(1 for op in report.values() if op['covered'])
+        print(f"\n📊 API coverage: {covered}/{len(report)} operations")
+        for operation, result in report.items():
+            if result['covered']:
+                print(f"  ✅ {operation} after {result['time_to_coverage']:.1f}s")
+            else:
+                print(f"  ❌ {operation}")
 
-    async def route_handler(self, route):
+    def _track_request(self, page: Optional[Page], delta: int):
+        """Count an API request starting (+1) or finishing (-1) on a page"""
+        if page is None:
+            return
+        self.inflight_requests[page] = self.inflight_requests.get(page, 0) + delta
+        self.last_network_activity[page] = asyncio.get_running_loop().time()
+
+    async def settle(self, page: Page) -> float:
+        """
+        Wait until the page has had no API requests in flight and no DOM changes for
+        settle_quiet_ms, or until settle_timeout. Returns the seconds spent waiting.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while loop.time() - start < self.settle_timeout:
+            if self.inflight_requests.get(page, 0) == 0:
+                try:
+                    dom_quiet_ms = await page.evaluate(
+                        "() => performance.now() - (window.__crawlerLastMutation || 0)"
+                    )
+                except Exception:
+                    dom_quiet_ms = 0  # The page is navigating
+                last_activity = max(start, self.last_network_activity.get(page, start))
+                network_quiet_ms = (loop.time() - last_activity) * 1000
+                if min(dom_quiet_ms, network_quiet_ms) >= self.settle_quiet_ms:
+                    break
+            await asyncio.sleep(0.05)
+            
+        elapsed = loop.time() - start
+        self.settle_times.append(elapsed)
+        print(f"⏱️ Page settled in {elapsed:.2f}s")
+        return elapsed
+
+    async def route_handler(self, route, user: Optional[str] = None):
         """Handle route interception for request/response logging"""
         request = route.request
         
+        # Let ignored resources through, or drop them in lean mode, without fetching them in Python
+        if not self.should_log_request(request.url, request.resource_type):
+            if self.lean and request.resource_type in LEAN_ABORT_RESOURCE_TYPES:
+                await route.abort()
+            else:
+                await route.continue_()
+            return
+        
+        # Only API traffic counts towards a page being busy
+        page = self._request_page(request)
+        self._note_endpoint(page, request, user)
+        self._track_request(page, 1)
         try:
             # Continue the route and get response
             response = await route.fetch()
             
-            # Log request first
-            await self.log_request(request)
+            # Log request first, keeping the id that pairs it with its response
+            request_id = await self.log_request(request, user)
             
             # Get response body before creating response object
             response_body = None
@@ -229,7 +843,8 @@ class WebCrawler:
                 'status_text': response.status_text,
                 'headers': response.headers,
                 'body': response_body,
-                'request': request
+                'request': request,
+                'request_id': request_id
             }
             
             await self.log_response(response_with_request)
@@ -240,15 +855,106 @@ class WebCrawler:
         except Exception as e:
             print(f"❌ Error in route handler: {str(e)}")
             await route.continue_()
+        finally:
+            self._track_request(page, -1)
+
+    async def start_capture(self, context: BrowserContext, page: Page, user: Optional[str] = None):
+        """Start logging the traffic of a page with the configured capture backend"""
+        if self.capture == 'cdp':
+            await self.attach_cdp_capture(context, page, user)
+        else:
+            await context.route(self.route_pattern, lambda route: self.route_handler(route, user))
+
+    async def attach_cdp_capture(self, context: BrowserContext, page: Page, user: Optional[str] = None):
+        """
+        Log a page's traffic from DevTools Network events. Nothing is intercepted, so the
+        page loads at native speed, and bodies are only fetched for logged requests.
+        """
+        session = await context.new_cdp_session(page)
+        session.on('Network.requestWillBeSent', lambda params: self.on_cdp_request(params, page, user))
+        session.on('Network.responseReceived', self.on_cdp_response)
+        session.on('Network.loadingFinished', lambda params: self.on_cdp_loading_finished(session, params))
+        session.on('Network.loadingFailed', self.on_cdp_loading_failed)
+        await session.send('Network.enable')
+        if self.lean:
+            await session.send('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+
+    def on_cdp_request(self, params: Dict, page: Page, user: Optional[str] = None):
+        """
+        Log a request as it is sent. Bookkeeping happens synchronously, so events for the
+        request that are dispatched before the logging task runs still find it.
+        """
+        # A redirect reuses the request id, so the previous hop ends with the redirect response
+        previous = self.cdp_requests.pop(params['requestId'], None)
+        if previous is not None and 'redirectResponse' in params:
+            asyncio.ensure_future(self.finish_cdp_request(previous, params['redirectResponse'], None))
+        
+        request = CDPRequest(params, page)
+        if not self.should_log_request(request.url, request.resource_type):
+            return
+        self.cdp_requests[params['requestId']] = {
+            'logged': asyncio.ensure_future(self.log_request(request, user)),
+            'request': request,
+            'response': None
+        }
+        self._note_endpoint(page, request, user)
+        self._track_request(page, 1)
+
+    def on_cdp_response(self, params: Dict):
+        """Keep the response headers of a logged request until its body has loaded"""
+        pending = self.cdp_requests.get(params['requestId'])
+        if pending is not None:
+            pending['response'] = params['response']
+
+    async def on_cdp_loading_finished(self, session: CDPSession, params: Dict):
+        """Fetch the body of a logged request once it has fully loaded and log the response"""
+        pending = self.cdp_requests.pop(params['requestId'], None)
+        if pending is None:
+            return
+        if pending['response'] is None:
+            self._track_request(pending['request'].page, -1)
+            return
+        
+        body = None
+        try:
+            result = await session.send('Network.getResponseBody', {'requestId': params['requestId']})
+            body = result['body']
+            if result.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8', errors='replace')
+        except Exception as e:
+            print(f"⚠️ Failed to get response body: {str(e)}")
+        await self.finish_cdp_request(pending, pending['response'], body)
+
+    def on_cdp_loading_failed(self, params: Dict):
+        """Stop tracking a request that failed; it stays in the log without a response"""
+        pending = self.cdp_requests.pop(params['requestId'], None)
+        if pending is not None:
+            print(f"⚠️ Request failed: {params.get('errorText')} {pending['request'].url}")
+            self._track_request(pending['request'].page, -1)
+
+    async def finish_cdp_request(self, pending: Dict, response: Dict, body: Optional[str]):
+        """Log the response of a request captured through CDP"""
+        try:
+            await self.log_response({
+                'url': response['url'],
+                'status': response['status'],
+                'status_text': response.get('statusText', ''),
+                'headers': {k.lower(): v for k, v in response.get('headers', {}).items()},
+                'body': body,
+                'request': pending['request'],
+                'request_id': await pending['logged']
+            })
+        finally:
+            self._track_request(pending['request'].page, -1)
 
     async def wait_for_app_load(self, page: Page):
-        """Wait for React app to load and render"""
+        """Wait for React app to load and render, then for the page to settle"""
         try:
             # Reduced timeout and wait time
             await page.wait_for_selector('#root > *', timeout=3000)
-            await asyncio.sleep(0.5)  # Reduced from 2s to 0.5s
         except Exception as e:
             print(f"⚠️ Error waiting for app load: {e}")
+        await self.settle(page)
 
     async def is_login_page(self, page: Page) -> bool:
         """Detect if current page is a login page"""
@@ -280,7 +986,7 @@ class WebCrawler:
             await page.click('button[type="submit"]')
             
             # Wait for navigation
-            await asyncio.sleep(2)
+            await self.settle(page)
             
             # Check if login was successful
             if await self.is_logged_in(page):
@@ -338,7 +1044,7 @@ class WebCrawler:
                     # Make sure element is visible and clickable
                     if await element.is_visible() and await element.is_enabled():
                         await element.click()
-                        await page.wait_for_load_state('networkidle')
+                        await self.settle(page)
                         # Verify we're logged out by checking for login page
                         if await self.is_login_page(page):
                             print("✅ Successfully logged out")
@@ -359,13 +1065,13 @@ class WebCrawler:
             
             # Wait for the dialog to be fully visible
             await page.wait_for_selector('[role="dialog"]', timeout=1000)
-            await asyncio.sleep(1)  # Wait for dialog animation
+            await self.settle(page)  # Wait for dialog animation
             
             # Try to fill Test Type
             try:
                 await page.fill('div[role="dialog"] input[type="text"]', 'Blood Test')
                 print("✅ Filled Test Type field")
-                await asyncio.sleep(1)
+                await self.settle(page)
             except Exception as e:
                 print(f"⚠️ Failed to fill Test Type: {str(e)}")
             
@@ -373,7 +1079,7 @@ class WebCrawler:
             try:
                 await page.fill('div[role="dialog"] textarea', 'Normal Range - 120/80')
                 print("✅ Filled Result field")
-                await asyncio.sleep(1)
+                await self.settle(page)
             except Exception as e:
                 print(f"⚠️ Failed to fill Result: {str(e)}")
             
@@ -381,23 +1087,23 @@ class WebCrawler:
             try:
                 await page.fill('div[role="dialog"] input[type="date"]', '2025-02-16')
                 print("✅ Filled Date field")
-                await asyncio.sleep(1)
+                await self.settle(page)
             except Exception as e:
                 print(f"⚠️ Failed to fill Date: {str(e)}")
             
             # Look for submit button and click it
             submit_button = await page.wait_for_selector('div[role="dialog"] button:has-text("Add Test Result")', timeout=1000)
             if submit_button:
-                await asyncio.sleep(1)  # Wait before clicking
+                await self.settle(page)  # Wait before clicking
                 await submit_button.click()
-                await page.wait_for_load_state('networkidle', timeout=3000)
+                await self.settle(page)
                 print("✅ Submitted form")
                 
                 # Wait for dialog to close
                 try:
                     await page.wait_for_selector('[role="dialog"]', state='hidden', timeout=3000)
                     print("✅ Dialog closed")
-                    await asyncio.sleep(1)
+                    await self.settle(page)
                 except Exception as e:
                     print(f"⚠️ Dialog might not have closed: {str(e)}")
                     
@@ -438,15 +1144,17 @@ class WebCrawler:
     async def get_element_identifier(self, element) -> str:
         """Create a unique identifier for an element"""
         try:
-            tag = await element.evaluate('el => el.tagName')
-            text = (await element.text_content() or '').strip()
-            href = await element.get_attribute('href') or ''
-            id_attr = await element.get_attribute('id') or ''
-            classes = await element.get_attribute('class') or ''
-            return f"{tag}|{text}|{href}|{id_attr}|{classes}"
+            return await element.evaluate(
+                """el => [el.tagName.toLowerCase(), (el.textContent || '').replace(/\\s+/g, ' ').trim().slice(0, 200),
+                         el.getAttribute('href') || '', el.id, el.getAttribute('class') || ''].join('|')"""
+            )
         except:
             return ''
 
+    async def describe_clickable_elements(self, page: Page) -> List[Dict]:
+        """Describe all clickable elements on the page with a single evaluate call"""
+        return await page.evaluate(ELEMENT_DESCRIPTORS_SCRIPT, CLICKABLE_SELECTOR)
+
     async def get_all_links(self, page: Page) -> list:
         """Get all links on the page"""
         links = []
@@ -471,8 +1179,22 @@ class WebCrawler:
             print(f"Error getting links: {e}")
         return links
 
-    async def explore_as_user(self, page: Page, credentials: Dict[str, str]):
-        """Explore the site as a specific user"""
+    async def explore_as_user(
+        self,
+        page: Page,
+        credentials: Dict[str, str],
+        partition: Tuple[int, int] = (0, 1),
+        logout: bool = True,
+        restored: bool = False
+    ):
+        """
+        Explore the site as a specific user
+        
+        partition is (index, count): only every count-th element of the start page,
+        from index, is explored. With logout=False the session is left open, which is
+        used when the whole browser context is thrown away afterwards. restored means
+        the page's context was created from a saved session, so logging in can be skipped.
+        """
         self.current_user = credentials['username']
         print(f"\n👤 Exploring as user: {self.current_user}")
         
@@ -486,28 +1208,44 @@ class WebCrawler:
         print(f"🌐 Navigating to {self.start_url}")
         await page.goto(self.start_url)
         await self.wait_for_app_load(page)
-        await asyncio.sleep(1)  # 1 second delay after navigation
         
-        # Login
-        if not await self.handle_login(page, credentials):
-            print(f"❌ Failed to login as {self.current_user}")
-            return
+        # Login, unless the restored session is still accepted
+        if restored and await self.is_logged_in(page):
+            print(f"🔑 Restored saved session for {self.current_user}")
+        else:
+            if restored:
+                print(f"⌛ Saved session for {self.current_user} is no longer valid, logging in")
+                self.session_store.invalidate(self.start_url, self.current_user)
+            if not await self.handle_login(page, credentials):
+                print(f"❌ Failed to login as {self.current_user}")
+                return
+            if self.session_store is not None:
+                self.session_store.put(self.start_url, self.current_user, await page.context.storage_state())
         
         # Explore the site
-        await self.explore_page(page)
+        if self.strategy == 'frontier':
+            await self.explore_frontier(page, partition=partition)
+        else:
+            await self.explore_page(page, max_depth=self.max_depth, partition=partition)
+        self.completed_crawls.add(self.crawl_key(self.current_user, partition[0]))
+        self.frontiers.pop(self.crawl_key(self.current_user, partition[0]), None)
+        self.save_checkpoint()
+        
+        if not logout:
+            return
         
-        print(f"\n⏳ Waiting 10 seconds before logout...")
-        await asyncio.sleep(10)  # 10 second delay before logout
+        print(f"\n⏳ Waiting for the page to settle before logout...")
+        await self.settle(page)
         
         # Logout
         await self.handle_logout(page)
         
         # Wait for logout to complete and return to login page
-        await asyncio.sleep(2)
+        await self.settle(page)
         await page.goto(self.start_url)
-        await asyncio.sleep(2)
+        await self.settle(page)
 
-    async def explore_page(self, page: Page, depth: int = 0, max_depth: int = 5):
+    async def explore_page(self, page: Page, depth: int = 0, max_depth: int = 5, partition: Tuple[int, int] = (0, 1)):
         """Explore a single page by clicking all clickable elements"""
         if depth >= max_depth:
             return
@@ -517,20 +1255,27 @@ class WebCrawler:
         # Store current URL to detect navigation
         current_url = page.url
         
-        # Get all clickable elements
-        clickable_elements = await page.query_selector_all('a, button, input[type="submit"]')
+        # Describe all clickable elements in one round trip
+        try:
+            descriptors = await self.describe_clickable_elements(page)
+        except Exception as e:
+            print(f"⚠️ Failed to find clickable elements: {str(e)}")
+            return
         clicked_elements = set()
         
-        for element in clickable_elements:
+        partition_index, partition_count = partition
+        for index, descriptor in enumerate(descriptors):
+            # Contexts sharing a user split the start page's elements between them
+            if depth == 0 and index % partition_count != partition_index:
+                continue
             try:
-                # Skip if already clicked
-                element_id = await element.evaluate('element => element.outerHTML')
-                if element_id in clicked_elements:
+                # Skip if already clicked, or if it can't be clicked
+                element_id = descriptor['fingerprint']
+                if element_id in clicked_elements or not descriptor['visible']:
                     continue
                 
-                # Get element text and attributes for better logging
-                element_text = await element.text_content()
-                element_type = await element.evaluate('element => element.tagName.toLowerCase()')
+                element_text = descriptor['text']
+                element_type = descriptor['tag']
                 
                 # Skip logout button
                 if element_text and any(keyword in element_text.lower() for keyword in ['logout', 'sign out']):
@@ -541,10 +1286,9 @@ class WebCrawler:
                 # Store pre-click URL to detect navigation
                 pre_click_url = page.url
                 
-                # Click the element
-                await element.click(timeout=1000)
-                await page.wait_for_load_state('networkidle', timeout=3000)
-                await asyncio.sleep(1)  # 1 second delay after each click
+                # Click the element, found again by its path since earlier clicks may have re-rendered the page
+                await page.click(descriptor['selector'], timeout=1000)
+                await self.settle(page)
                 
                 # Mark this element as clicked
                 clicked_elements.add(element_id)
@@ -556,8 +1300,7 @@ class WebCrawler:
                     await self.fill_form(page, element_id)
                     # Wait for modal to close
                     await page.wait_for_selector('.modal, [role="dialog"], .dialog', state='hidden', timeout=3000)
-                    await page.wait_for_load_state('networkidle', timeout=3000)
-                    await asyncio.sleep(1)  # 1 second delay after modal interaction
+                    await self.settle(page)
                 
                 # If URL changed, explore the new page
                 if page.url != pre_click_url:
@@ -566,13 +1309,184 @@ class WebCrawler:
                     # Go back if we navigated away
                     if page.url != pre_click_url:
                         await page.goto(pre_click_url)
-                        await page.wait_for_load_state('networkidle')
-                        await asyncio.sleep(1)  # 1 second delay after navigation
+                        await self.settle(page)
                 
             except Exception as e:
                 print(f"⚠️ Failed to interact with element: {str(e)}")
                 continue
 
+    async def state_hash(self, page: Page, descriptors: List[Dict]) -> str:
+        """Hash the page's normalized URL and the set of actions it offers"""
+        signatures = sorted({element_signature(d) for d in descriptors if d['visible']})
+        state = normalize_url_path(page.url) + '\n' + '\n'.join(signatures)
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+
+    async def restore_state(self, page: Page, url: str, path: Tuple[str, ...]) -> bool:
+        """Return to a state by loading its URL and replaying the clicks that led to it"""
+        try:
+            await page.goto(url)
+            await self.settle(page)
+            for selector in path:
+                await page.click(selector, timeout=1000)
+                await self.settle(page)
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to restore state at {url}: {str(e)}")
+            return False
+
+    async def explore_frontier(self, page: Page, partition: Tuple[int, int] = (0, 1)):
+        """
+        Explore distinct page states, highest-yield first, up to max_actions clicks.
+        
+        States are identified by state_hash, so structurally identical pages are only
+        explored once per user. Clicks are ordered by how many new API operations the same
+        element produced before, and states reached by productive clicks are explored
+        first. The crawl stops once the user has exercised every operation in the spec,
+        or once coverage_patience clicks in a row found no operation new to the user.
+        
+        What an action triggers is shared across users: an action already performed in the
+        same state, by any user, is skipped once this user has exercised every endpoint it
+        triggered; the page it navigated to is still queued so that states beyond it are reached.
+        """
+        user = self.current_user
+        partition_index, partition_count = partition
+        crawl_key = self.crawl_key(user, partition_index)
+        # Progress lives on the crawler so checkpoints can save it, and a resumed crawl picks it up
+        progress = self.frontiers.setdefault(crawl_key, {
+            # Each item is (-new operations found on the way, depth, order, url, clicks from that URL)
+            'frontier': [(0, 0, 0, page.url, ())],
+            'order': 1,
+            'queued': set(),
+            'queued_urls': set(),
+            'actions': 0,
+            'since_new_coverage': 0
+        })
+        frontier = progress['frontier']
+        queued = progress['queued']
+        queued_urls = progress['queued_urls']
+        order = progress['order']
+        actions = progress['actions']
+        since_new_coverage = progress['since_new_coverage']
+        # (url, path) of the state the page is known to be in, or None after it changed
+        location = (page.url, ())
+        
+        def plateaued() -> bool:
+            return self.coverage_complete(user) or (
+                self.coverage_patience is not None and since_new_coverage >= self.coverage_patience
+            )
+        
+        while frontier and actions < self.max_actions and not plateaued():
+            # Every state popped so far has been fully explored, so this is a safe point to checkpoint
+            progress.update(order=order, actions=actions, since_new_coverage=since_new_coverage, current=None)
+            self.maybe_save_checkpoint()
+            item = heapq.heappop(frontier)
+            # Lets a checkpoint taken by another context put this state back if it is cut short
+            progress['current'] = (item, None)
+            _, depth, _, url, path = item
+            if location != (url, path):
+                if not await self.restore_state(page, url, path):
+                    location = None
+                    continue
+                location = (url, path)
+            try:
+                descriptors = await self.describe_clickable_elements(page)
+            except Exception as e:
+                print(f"⚠️ Failed to find clickable elements: {str(e)}")
+                continue
+            state = await self.state_hash(page, descriptors)
+            # Contexts sharing a user each explore their own share of the start page, so
+            # the start state is only marked visited for this context's share of it
+            visited = (crawl_key, state) if depth == 0 and partition_count > 1 else (user, state)
+            if visited in self.visited_states:
+                continue
+            self.visited_states.add(visited)
+            progress['current'] = (item, visited)
+            print(f"\n🔍 Exploring state {state}: {page.url} (depth: {depth})")
+            
+            # Contexts sharing a user split the start page's elements between them
+            candidates = [
+                d for index, d in enumerate(descriptors)
+                if d['visible'] and (depth > 0 or index % partition_count == partition_index)
+                and not any(keyword in d['text'].lower() for keyword in ['logout', 'sign out'])
+            ]
+            # Most productive elements first; sorting is stable, so ties keep DOM order
+            candidates.sort(key=lambda d: -self.action_priority(element_signature(d)))
+            
+            for descriptor in candidates:
+                if actions >= self.max_actions or plateaued():
+                    break
+                signature = element_signature(descriptor)
+                action = (state, signature)
+                known = self.action_endpoints.get(action)
+                if known is not None and known <= self.user_exercised_endpoints.get(user, set()):
+                    target = self.action_targets.get(action)
+                    if target is not None and target not in queued_urls and depth + 1 < self.max_depth:
+                        queued_urls.add(target)
+                        heapq.heappush(frontier, (0, depth + 1, order, target, ()))
+                        order += 1
+                    continue
+                
+                try:
+                    # Earlier actions may have left this state, so come back to it first
+                    if location != (url, path):
+                        if not await self.restore_state(page, url, path):
+                            break
+                        location = (url, path)
+                    print(f"🖱️ Clicking {descriptor['tag']}: {descriptor['text'] or 'unnamed element'}")
+                    self.page_endpoints[page] = set()
+                    self.page_new_coverage[page] = 0
+                    self.page_new_user_coverage[page] = 0
+                    await page.click(descriptor['selector'], timeout=1000)
+                    await self.settle(page)
+                    actions += 1
+                    
+                    # Check if a modal dialog appeared
+                    modal = await page.query_selector('.modal, [role="dialog"], .dialog')
+                    if modal:
+                        print(f"📝 Found modal dialog after clicking {descriptor['text']}")
+                        await self.fill_form(page, descriptor['fingerprint'])
+                        await page.wait_for_selector('.modal, [role="dialog"], .dialog', state='hidden', timeout=3000)
+                        await self.settle(page)
+                    self.action_endpoints.setdefault(action, set()).update(self.page_endpoints.pop(page, set()))
+                    
+                    # Score the element by the operations it covered first
+                    new_operations = self.page_new_coverage.pop(page, 0)
+                    found, clicks = self.action_yield.get(signature, (0, 0))
+                    self.action_yield[signature] = (found + new_operations, clicks + 1)
+                    since_new_coverage = 0 if self.page_new_user_coverage.pop(page, 0) else since_new_coverage + 1
+                    
+                    # Queue the state the click led to, if it is new
+                    new_state = await self.state_hash(page, await self.describe_clickable_elements(page))
+                    if new_state == state and page.url == url:
+                        continue
+                    location = None
+                    if page.url != url:
+                        self.action_targets[action] = page.url
+                    if depth + 1 >= self.max_depth or new_state in queued or (user, new_state) in self.visited_states:
+                        continue
+                    queued.add(new_state)
+                    if page.url != url:
+                        self.visited_urls_by_user[user].add(page.url)
+                        queued_urls.add(page.url)
+                        heapq.heappush(frontier, (-new_operations, depth + 1, order, page.url, ()))
+                    else:
+                        heapq.heappush(frontier, (-new_operations, depth + 1, order, url, path + (descriptor['selector'],)))
+                    order += 1
+                except Exception as e:
+                    print(f"⚠️ Failed to interact with element: {str(e)}")
+                    self.page_endpoints.pop(page, None)
+                    self.page_new_coverage.pop(page, None)
+                    self.page_new_user_coverage.pop(page, None)
+                    location = None
+                    
+        progress.update(order=order, actions=actions, since_new_coverage=since_new_coverage, current=None)
+        if self.coverage_complete(user):
+            print(f"🎯 Every operation in the spec is covered for {user}")
+        elif plateaued():
+            print(f"📉 No new operations in {since_new_coverage} clicks, stopped early")
+        explored = len([s for u, s in self.visited_states if u in (user, crawl_key)])
+        print(f"\n✅ Explored {explored} states with {actions} actions as {user}")
+
     def get_visited_urls(self) -> Set[str]:
         """Get visited URLs for current user"""
         return self.visited_urls_by_user.get(self.current_user, set())
@@ -581,63 +1495,171 @@ class WebCrawler:
         """Get clicked elements for current user"""
         return self.clicked_elements_by_user.get(self.current_user, set())
 
-    async def run(self):
-        """Run the web crawler"""
+    async def explore_in_context(self, browser: Browser, credentials: Dict[str, str], partition: Tuple[int, int]):
+        """Explore as a user in a fresh, isolated browser context"""
+        username = credentials['username']
+        storage_state = self.session_store.get(self.start_url, username) if self.session_store else None
+        context = await browser.new_context(
+            viewport={'width': 1920, 'height': 1080},
+            storage_state=storage_state
+        )
+        try:
+            await context.add_init_script(MUTATION_TRACKER_SCRIPT)
+            page = await context.new_page()
+            # Tag everything this context sends with its user
+            await self.start_capture(context, page, username)
+            await self.explore_as_user(page, credentials, partition=partition, logout=False,
+                                       restored=storage_state is not None)
+        except Exception as e:
+            print(f"❌ Crawl as {username} failed: {str(e)}")
+        finally:
+            await context.close()
+
+    async def run_parallel(self, browser: Browser):
+        """Crawl all users concurrently, with at most max_parallel_contexts contexts at once"""
+        limit = asyncio.Semaphore(self.max_parallel_contexts)
+        
+        async def crawl(credentials, partition):
+            if self.crawl_key(credentials['username'], partition[0]) in self.completed_crawls:
+                print(f"⏭️ Skipping {credentials['username']}, already crawled")
+                return
+            async with limit:
+                await self.explore_in_context(browser, credentials, partition)
+        
+        await asyncio.gather(*(
+            crawl(credentials, (index, self.contexts_per_user))
+            for credentials in self.credentials
+            for index in range(self.contexts_per_user)
+        ))
+        
+        for credentials in self.credentials:
+            print(f"\nPages visited by user {credentials['username']}:")
+            for url in self.visited_urls_by_user.get(credentials['username'], set()):
+                print(f"  - {url}")
+
+    async def run(self, resume: bool = False):
+        """Run the web crawler, continuing from checkpoint_file if resume is set"""
         async with async_playwright() as p:
             browser = await p.chromium.launch(
                 headless=False,  # Set to True for headless mode
                 args=['--start-maximized']
             )
+            self.crawl_started = time.monotonic()
+            if resume:
+                self.load_checkpoint()
+            
+            if self.parallel:
+                print(f"\n🔄 Starting parallel crawl with {len(self.credentials)} users")
+                if self.log_format == 'ndjson':
+                    self.open_network_log()
+                try:
+                    await self.run_parallel(browser)
+                finally:
+                    self.print_coverage_summary()
+                    log_file = self.save_network_log()
+                    print(f"\nNetwork log saved to: {log_file}")
+                    self.clear_checkpoint()
+                await browser.close()
+                return
             
             context = await browser.new_context(
                 viewport={'width': 1920, 'height': 1080}
             )
+            await context.add_init_script(MUTATION_TRACKER_SCRIPT)
             
             # Create a new page
             page = await context.new_page()
             
-            # Set up request interception
-            await page.route("**/*", self.route_handler)
+            # Set up request capture
+            await self.start_capture(context, page)
             
             print("\n🔄 Starting crawl with credentials:")
             for cred in self.credentials:
                 print(f"  - {cred['username']} ({cred['role']})")
             
-            # Explore with each set of credentials
-            for credentials in self.credentials:
-                await self.explore_as_user(page, credentials)
-                
-                # Print pages visited by this user
-                print(f"\nPages visited by user {credentials['username']}:")
-                if credentials['username'] in self.visited_urls_by_user:
-                    for url in self.visited_urls_by_user[credentials['username']]:
-                        print(f"  - {url}")
-                else:
-                    print("  No pages visited")
-                
-                print("\n---\n")  # Separator between users
+            if self.log_format == 'ndjson':
+                self.open_network_log()
             
-            # Save network log
-            log_file = self.save_network_log()
-            print(f"\nNetwork log saved to: {log_file}")
+            try:
+                # Explore with each set of credentials
+                for credentials in self.credentials:
+                    if self.crawl_key(credentials['username']) in self.completed_crawls:
+                        print(f"⏭️ Skipping {credentials['username']}, already crawled")
+                        continue
+                    if self.session_store is not None:
+                        # Saved sessions can only be restored into a fresh context, which also makes logging out unnecessary
+                        await self.explore_in_context(browser, credentials, (0, 1))
+                    else:
+                        await self.explore_as_user(page, credentials)
+                    
+                    # Print pages visited by this user
+                    print(f"\nPages visited by user {credentials['username']}:")
+                    if credentials['username'] in self.visited_urls_by_user:
+                        for url in self.visited_urls_by_user[credentials['username']]:
+                            print(f"  - {url}")
+                    else:
+                        print("  No pages visited")
+                    
+                    print("\n---\n")  # Separator between users
+            finally:
+                # Save network log, even if the crawl failed part way
+                self.print_coverage_summary()
+                log_file = self.save_network_log()
+                print(f"\nNetwork log saved to: {log_file}")
+                self.clear_checkpoint()
             
             print("\nKeeping browser open for 5 seconds...")
             await asyncio.sleep(5)
             
             await browser.close()
 
+    def replay_users(
+        self,
+        recorded_log: str,
+        source_user: Optional[str] = None,
+        id_aliases: Optional[Dict[str, str]] = None
+    ) -> List[str]:
+        """
+        Crawl as every other user without a browser, by replaying the API calls recorded
+        for source_user over HTTP. Returns the paths of the per-user network logs.
+        
+        Ids in URLs are matched to the OpenAPI spec's path parameters when one was loaded.
+        id_aliases maps resource kinds that share ids, e.g. {'patient': 'user'}.
+        """
+        from api_replay import ApiReplayer
+        
+        log_files = []
+        for credentials in self.credentials:
+            if credentials['username'] == source_user:
+                continue
+            print(f"\n🔁 Replaying {recorded_log} as {credentials['username']}")
+            # A replayer, and its connections, per user so nothing of one user's session carries over
+            replayer = ApiReplayer(recorded_log, source_user, path_templates=self.template_trie, id_aliases=id_aliases)
+            try:
+                entries = replayer.replay(credentials)
+                log_files.append(replayer.save(entries, credentials, self.start_url))
+            finally:
+                replayer.close()
+        return log_files
+
     def save_network_log(self):
-        """Save the network log to a JSON file"""
+        """Save the network log to a JSON file, or finish the streaming NDJSON log"""
+        if self.log_writer is not None:
+            # Requests still waiting for a response are written as they are
+            for entry in self.pending_requests.values():
+                self.complete_entry(entry)
+            self.pending_requests.clear()
+            self.log_writer.close(metadata={'total_requests': self.request_counter})
+            self.log_writer = None
+            print(f"\n💾 Saved network log to {self.log_file}")
+            return self.log_file
+            
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'network_log_{timestamp}.json'
         
         with open(filename, 'w') as f:
             json.dump({
-                'metadata': {
-                    'start_url': self.start_url,
-                    'timestamp': datetime.now().isoformat(),
-                    'total_requests': self.request_counter
-                },
+                'metadata': dict(self.log_metadata(filename), total_requests=self.request_counter),
                 'requests': self.network_log
             }, f, indent=2)
         
@@ -645,11 +1667,25 @@ class WebCrawler:
         return filename
 
 async def main():
+    parser = argparse.ArgumentParser(description="Crawl a web app as every user in a credentials file")
+    parser.add_argument('--checkpoint', nargs='?', const='crawl_checkpoint.json',
+                        help="Checkpoint crawl progress to this file (default crawl_checkpoint.json) "
+                             "and stream an NDJSON log instead of writing JSON at the end")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue the crawl saved in the checkpoint file")
+    args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        args.checkpoint = 'crawl_checkpoint.json'
+    
     # Replace with your target website
     target_url = "http://localhost:3000/"
     credentials_file = "credentials.csv"
-    crawler = WebCrawler(target_url, credentials_file)
-    await crawler.run()
+    if args.checkpoint:
+        # Checkpoints record a position in the log, so they need the streaming format
+        crawler = WebCrawler(target_url, credentials_file, log_format='ndjson', checkpoint_file=args.checkpoint)
+    else:
+        crawler = WebCrawler(target_url, credentials_file)
+    await crawler.run(resume=args.resume)
 
 if __name__ == "__main__":
     asyncio.run(main())